@@ -1 +1,6 @@
-from el2805.agents.agent import Agent
+from el2805.utils import lazy_attributes
+
+__all__ = ["Agent"]
+__getattr__, __dir__ = lazy_attributes(__name__, {
+    "Agent": "agent"
+})
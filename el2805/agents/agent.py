@@ -1,15 +1,37 @@
 import gym
+import importlib
+import inspect
+import json
 import numpy as np
 import pickle
+import sys
 from abc import ABC, abstractmethod
 from pathlib import Path
 from copy import deepcopy
 from typing import Union
+from el2805.utils import get_make_arguments, make_environment
+
+_MANIFEST_FILENAME = "manifest.json"
+_TENSORS_FILENAME = "tensors.pt"
+_STATE_FILENAME = "state.pkl"
+_ENVIRONMENT_FILENAME = "environment.pkl"
+_FORMAT_VERSION = 1
 
 
 class Agent(ABC):
     """Interface for an agent controlling a stochastic Markovian dynamical system."""
 
+    _replay_buffer_state_keys = ()     # keys of the state_dict() with the stored experiences
+    _optimizer_state_keys = ()         # keys of the state_dict() with the optimizer states
+
+    def __new__(cls, *args, **kwargs):
+        agent = super().__new__(cls)
+        # constructor arguments except the environment (saved apart), written in the manifest to rebuild the agent
+        # (empty when unpickling)
+        config = inspect.signature(cls.__init__).bind_partial(None, *args, **kwargs).arguments
+        agent._config = {name: value for name, value in list(config.items())[1:] if name != "environment"}
+        return agent
+
     def __init__(self, environment: gym.Env):
         """
         :param environment: RL environment
@@ -26,23 +48,190 @@ class Agent(ABC):
         """
         raise NotImplementedError
 
-    def save(self, filepath: str | Path):
-        """Saves the whole agent in a pickle file.
+    @abstractmethod
+    def state_dict(self) -> dict:
+        """Returns the state of the agent, that is, everything that is not determined by its configuration (e.g.,
+        learned parameters, policy).
+
+        :return: state of the agent
+        :rtype: dict
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def load_state_dict(self, state: dict) -> None:
+        """Restores a state returned by state_dict() of an agent with the same configuration.
+
+        :param state: state of the agent
+        :type state: dict
+        """
+        raise NotImplementedError
+
+    def save(self, filepath: str | Path, *, include_replay_buffer: bool = True, include_optimizer: bool = True):
+        """Saves the agent in a directory, with a JSON manifest containing its configuration, the tensors of its state
+        in a PyTorch file and the arrays in NumPy files (the rest of the state, made of built-in objects, is pickled).
+        The environment is not saved if it can be rebuilt by gym.make() (see get_make_arguments()).
 
-        :param filepath: path where to save the agent
+        :param filepath: path of the directory where to save the agent
         :type filepath: str or Path
+        :param include_replay_buffer: whether to save the stored experiences (e.g., replay buffer), which are needed
+            only to continue training
+        :type include_replay_buffer: bool, optional
+        :param include_optimizer: whether to save the optimizer states, which are needed only to continue training
+        :type include_optimizer: bool, optional
         """
-        with open(filepath, mode="wb") as file:
-            pickle.dump(self, file)
+        # The configuration is checked first, so that nothing is written if the agent cannot be saved
+        config = self._get_config()
+        for name, value in config.items():
+            if not _is_json_serializable(value):
+                raise TypeError(
+                    f"The agent cannot be saved: the constructor argument '{name}' of type {type(value).__name__} is "
+                    f"not JSON serializable"
+                )
+
+        filepath = Path(filepath)
+        filepath.mkdir(parents=True, exist_ok=True)
+
+        # State
+        state = self._get_state(include_replay_buffer=include_replay_buffer, include_optimizer=include_optimizer)
+        tensors = {}
+        arrays = {}
+        state = _split_state(state, tensors, arrays)
+        if len(tensors) > 0:
+            import torch
+            torch.save(tensors, filepath / _TENSORS_FILENAME)
+        for filename, array in arrays.items():
+            np.save(filepath / filename, array)
+        with open(filepath / _STATE_FILENAME, mode="wb") as file:
+            pickle.dump(state, file)
+
+        # Environment
+        environment = get_make_arguments(self.environment)
+        if environment is None or not _is_json_serializable(environment):
+            with open(filepath / _ENVIRONMENT_FILENAME, mode="wb") as file:
+                pickle.dump(self.environment, file)
+            environment = {"filename": _ENVIRONMENT_FILENAME}
+
+        # Manifest
+        manifest = {
+            "format_version": _FORMAT_VERSION,
+            "module": type(self).__module__,
+            "class": type(self).__qualname__,
+            "config": config,
+            "environment": environment,
+            "arrays": sorted(arrays)
+        }
+        with open(filepath / _MANIFEST_FILENAME, mode="w") as file:
+            json.dump(manifest, file, indent=4)
 
     @staticmethod
     def load(filepath: str | Path):
-        """Loads the whole agent from a pickle file.
+        """Loads an agent saved by save(). The agent is rebuilt from its configuration, and the saved state is loaded
+        from memory-mapped files. The parts of the state that were not saved (e.g., optimizer) are the ones of a new
+        agent.
 
         :param filepath: path where the agent is saved
         :type filepath: str or Path
         """
-        with open(filepath, mode="rb") as file:
-            agent = pickle.load(file)
-        assert isinstance(agent, Agent)
+        filepath = Path(filepath)
+        assert filepath.is_dir(), f"{filepath} is not a directory written by Agent.save()"
+
+        with open(filepath / _MANIFEST_FILENAME) as file:
+            manifest = json.load(file)
+        assert manifest["format_version"] == _FORMAT_VERSION
+
+        # Environment
+        if "id" in manifest["environment"]:
+            environment = make_environment(manifest["environment"])
+        else:
+            with open(filepath / manifest["environment"]["filename"], mode="rb") as file:
+                environment = pickle.load(file)
+
+        # State
+        tensors = {}
+        if (filepath / _TENSORS_FILENAME).exists():
+            import torch
+            tensors = torch.load(filepath / _TENSORS_FILENAME, mmap=True, weights_only=True, map_location="cpu")
+        arrays = {filename: np.load(filepath / filename, mmap_mode="r") for filename in manifest["arrays"]}
+        with open(filepath / _STATE_FILENAME, mode="rb") as file:
+            state = pickle.load(file)
+        state = _join_state(state, tensors, arrays)
+
+        # Agent
+        agent_class = getattr(importlib.import_module(manifest["module"]), manifest["class"])
+        assert issubclass(agent_class, Agent)
+        agent = agent_class._from_state(environment=environment, config=manifest["config"], state=state)
         return agent
+
+    def _get_config(self) -> dict:
+        # constructor arguments, except the environment
+        return dict(self._config)
+
+    def _get_state(self, *, include_replay_buffer: bool = True, include_optimizer: bool = True) -> dict:
+        # state_dict(), possibly without the stored experiences and the optimizer states
+        excluded_keys = set()
+        if not include_replay_buffer:
+            excluded_keys.update(self._replay_buffer_state_keys)
+        if not include_optimizer:
+            excluded_keys.update(self._optimizer_state_keys)
+        return {key: value for key, value in self.state_dict().items() if key not in excluded_keys}
+
+    @classmethod
+    def _from_state(cls, *, environment: gym.Env, config: dict, state: dict) -> "Agent":
+        # builds a new agent and loads the state returned by _get_state() (the missing parts are the ones of the new agent)
+        agent = cls(environment=environment, **config)
+        agent.load_state_dict(agent.state_dict() | state)
+        return agent
+
+
+def _is_json_serializable(obj) -> bool:
+    try:
+        json.dumps(obj)
+    except TypeError:
+        return False
+    return True
+
+
+class _StoredTensor(str):
+    pass
+
+
+class _StoredArray(str):
+    pass
+
+
+def _split_state(state, tensors: dict, arrays: dict):
+    # Replaces tensors and arrays with references to where they are stored (there are no tensors if torch is not loaded)
+    torch = sys.modules.get("torch")
+    if torch is not None and isinstance(state, torch.Tensor):
+        key = str(len(tensors))
+        tensors[key] = state.detach().cpu()
+        return _StoredTensor(key)
+    elif isinstance(state, np.ndarray):
+        filename = f"array{len(arrays)}.npy"
+        arrays[filename] = state
+        return _StoredArray(filename)
+    elif isinstance(state, dict):
+        return {key: _split_state(value, tensors, arrays) for key, value in state.items()}
+    elif isinstance(state, tuple) and hasattr(state, "_fields"):    # named tuple
+        return type(state)(*(_split_state(value, tensors, arrays) for value in state))
+    elif isinstance(state, (list, tuple)):
+        return type(state)(_split_state(value, tensors, arrays) for value in state)
+    else:
+        return state
+
+
+def _join_state(state, tensors: dict, arrays: dict):
+    # Inverse of _split_state()
+    if isinstance(state, _StoredTensor):
+        return tensors[str(state)]
+    elif isinstance(state, _StoredArray):
+        return arrays[str(state)]
+    elif isinstance(state, dict):
+        return {key: _join_state(value, tensors, arrays) for key, value in state.items()}
+    elif isinstance(state, tuple) and hasattr(state, "_fields"):
+        return type(state)(*(_join_state(value, tensors, arrays) for value in state))
+    elif isinstance(state, (list, tuple)):
+        return type(state)(_join_state(value, tensors, arrays) for value in state)
+    else:
+        return state
@@ -1,3 +1,8 @@
-from el2805.agents.mdp.mdp_agent import MDPAgent
-from el2805.agents.mdp.dynamic_programming import DynamicProgramming
-from el2805.agents.mdp.value_iteration import ValueIteration
+from el2805.utils import lazy_attributes
+
+__all__ = ["MDPAgent", "DynamicProgramming", "ValueIteration"]
+__getattr__, __dir__ = lazy_attributes(__name__, {
+    "MDPAgent": "mdp_agent",
+    "DynamicProgramming": "dynamic_programming",
+    "ValueIteration": "value_iteration"
+})
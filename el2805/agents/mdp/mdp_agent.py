@@ -25,6 +25,12 @@ class MDPAgent(Agent, ABC):
         """Calculates the optimal policy for the MDP."""
         raise NotImplementedError
 
+    def state_dict(self) -> dict:
+        return {"policy": self.policy}
+
+    def load_state_dict(self, state: dict) -> None:
+        self.policy = np.array(state["policy"]) if state["policy"] is not None else None
+
     def q(self, state: Any, action: int, v: np.ndarray) -> float:
         """Calculates the Q-function.
 
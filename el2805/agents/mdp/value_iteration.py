@@ -33,6 +33,15 @@ class ValueIteration(MDPAgent):
             a_best = q.argmax()     # index of best action for valid actions in this state
             self.policy[s] = valid_actions[a_best]
 
+    def state_dict(self) -> dict:
+        state = super().state_dict()
+        state["v"] = self._v
+        return state
+
+    def load_state_dict(self, state: dict) -> None:
+        super().load_state_dict(state)
+        self._v = np.array(state["v"])
+
     def compute_action(self, *, state: Any, **kwargs) -> int:
         _ = kwargs
         assert self.policy is not None
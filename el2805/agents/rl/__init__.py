@@ -1,7 +1,13 @@
-from el2805.agents.rl.rl_agent import RLAgent
-from el2805.agents.rl.random_agent import RandomAgent
-from el2805.agents.rl.q_agent import QAgent
-from el2805.agents.rl.sarsa import Sarsa
-from el2805.agents.rl.q_learning import QLearning
-from el2805.agents.rl.dqn import DQN
-from el2805.agents.rl.ppo import PPO
+from el2805.utils import lazy_attributes
+
+# The agents are imported at the first access, so that the tabular ones do not import torch
+__all__ = ["RLAgent", "RandomAgent", "QAgent", "Sarsa", "QLearning", "DQN", "PPO"]
+__getattr__, __dir__ = lazy_attributes(__name__, {
+    "RLAgent": "rl_agent",
+    "RandomAgent": "random_agent",
+    "QAgent": "q_agent",
+    "Sarsa": "sarsa",
+    "QLearning": "q_learning",
+    "DQN": "dqn",
+    "PPO": "ppo"
+})
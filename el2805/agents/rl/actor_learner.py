@@ -0,0 +1,275 @@
+import gym
+import numpy as np
+import time
+import queue
+import torch
+import torch.multiprocessing as mp
+from copy import deepcopy
+from tqdm import tqdm
+from el2805.agents.utils import RunningAverage
+from el2805.agents.rl.metric_recorder import MetricRecorder
+from el2805.agents.rl.utils import Experience, get_epsilon
+from el2805.agents.rl.replay_buffer import ReplayBuffer, NStepAccumulator
+from el2805.utils import decide_random, get_make_arguments, make_environment
+
+# Indices of the shared counters
+_N_STEPS = 0            # environment steps taken by all the actors
+_N_UPDATES = 1          # updates performed by the learner
+_N_EPISODES = 2         # episodes started by all the actors
+_WEIGHTS_VERSION = 3    # number of weight broadcasts
+_STOP = 4               # stop flag for the actors
+
+
+class ActorLearner:
+    """Asynchronous actor/learner training for DQN. Several actor processes interact with their own seeded copy of the
+    environment and write experiences into a replay buffer in shared memory. Meanwhile, the learner (the calling
+    process) updates the Q-network continuously and periodically broadcasts its weights to the actors."""
+
+    _poll_interval = 1e-4   # seconds
+
+    def __init__(
+            self,
+            agent,
+            *,
+            n_actors: int,
+            replay_ratio: float,
+            weights_sync_period: int,
+            max_pending_steps: int | None = None,
+            seed: int | None = None
+    ):
+        """Initializes an ActorLearner.
+
+        :param agent: DQN agent to train
+        :type agent: DQN
+        :param n_actors: number of actor processes
+        :type n_actors: int
+        :param replay_ratio: number of updates per environment step
+        :type replay_ratio: float
+        :param weights_sync_period: period for broadcasting the weights to the actors, expressed in number of updates
+        :type weights_sync_period: int
+        :param max_pending_steps: maximum number of environment steps that the actors can take ahead of the learner
+            (according to the replay ratio) before waiting for it, if None the actors never wait
+        :type max_pending_steps: int, optional
+        :param seed: seed used to generate the seeds of the actors
+        :type seed: int, optional
+        """
+        assert n_actors > 0 and replay_ratio > 0 and weights_sync_period > 0
+        assert agent.update_every == 1    # the learner is throttled by the replay ratio instead
+        self.agent = agent
+        self.n_actors = n_actors
+        self.replay_ratio = replay_ratio
+        self.weights_sync_period = weights_sync_period
+        self.max_pending_steps = max_pending_steps
+        self.seed = seed
+
+    def train(
+            self,
+            n_episodes: int,
+            early_stop_reward: float | None = None,
+            metrics: MetricRecorder | None = None
+    ) -> MetricRecorder:
+        """Trains the DQN agent for the specified number of episodes (completed by any of the actors).
+
+        :param n_episodes: number of training episodes
+        :type n_episodes: int
+        :param early_stop_reward: average reward considered as problem solved
+        :type early_stop_reward: float, optional
+        :param metrics: recorder where to store the training stats, if None they are kept in memory
+        :type metrics: MetricRecorder, optional
+        :return: training stats (per episode or per update, depending on the metric)
+        :rtype: MetricRecorder
+        """
+        agent = self.agent
+        context = mp.get_context("spawn")
+
+        # The actors write into a copy of the replay buffer in shared memory, which is copied back into the agent's
+        # buffer at the end (a shared buffer holds a lock, so the agent could not be pickled or copied anymore)
+        private_replay_buffer = agent._replay_buffer
+        replay_buffer = ReplayBuffer(
+            capacity=private_replay_buffer.capacity,
+            state_dim=private_replay_buffer.state_dim
+        ).share_memory_(context)
+        replay_buffer.load_state_dict(private_replay_buffer.state_dict())
+        agent._set_replay_buffer(replay_buffer)
+
+        counters = torch.zeros(5, dtype=torch.long).share_memory_()
+        lock = context.Lock()
+        episode_queue = context.Queue()
+        shared_q_network = deepcopy(agent.q_network).cpu().share_memory()
+
+        environment = get_make_arguments(agent.environment) or agent.environment
+        exploration = {
+            "epsilon": agent.epsilon,
+            "epsilon_max": agent.epsilon_max,
+            "epsilon_min": agent.epsilon_min,
+            "epsilon_decay_duration": agent.epsilon_decay_episodes,
+            "delta": agent.delta
+        }
+        seeds = [s.generate_state(1)[0] for s in np.random.SeedSequence(self.seed).spawn(self.n_actors)]
+        actors = [
+            context.Process(
+                target=_run_actor,
+                kwargs={
+                    "environment": environment,
+                    "seed": int(seed),
+                    "q_network": shared_q_network,
+                    "exploration": exploration,
+                    "n_step": agent.n_step,
+                    "discount": agent.discount,
+                    "replay_buffer": replay_buffer,
+                    "replay_buffer_min": agent.replay_buffer_min,
+                    "replay_ratio": self.replay_ratio,
+                    "max_pending_steps": self.max_pending_steps,
+                    "counters": counters,
+                    "lock": lock,
+                    "episode_queue": episode_queue
+                },
+                daemon=True
+            )
+            for seed in seeds
+        ]
+        for actor in actors:
+            actor.start()
+
+        stats = metrics if metrics is not None else MetricRecorder()
+        running_reward = RunningAverage()
+        episodes = tqdm(total=n_episodes, desc='Episode: ', leave=True)
+        n_updates = 0
+        try:
+            while stats.n_values("episode_reward") < n_episodes:
+                # Collect the episodes completed by the actors
+                solved = False
+                while stats.n_values("episode_reward") < n_episodes and not solved:
+                    try:
+                        episode_reward, episode_length = episode_queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    stats.append("episode_reward", episode_reward)
+                    stats.append("episode_length", episode_length)
+                    avg_episode_reward = running_reward.append(episode_reward)
+                    episodes.update()
+                    episodes.set_description(
+                        f"Episode {stats.n_values('episode_reward')} - "
+                        f"Reward: {episode_reward:.1f} - "
+                        f"Length: {episode_length} - "
+                        f"Avg reward: {avg_episode_reward:.1f} - "
+                        f"Updates: {n_updates}"
+                    )
+                    solved = early_stop_reward is not None and avg_episode_reward >= early_stop_reward
+                if solved:
+                    print("Early stopping: environment solved!")
+                    break
+
+                # Update the Q-network, unless the learner is ahead of the actors according to the replay ratio
+                n_steps = int(counters[_N_STEPS])
+                if len(replay_buffer) >= agent.replay_buffer_min and \
+                        n_updates < self.replay_ratio * (n_steps - agent.replay_buffer_min):
+                    update_stats = agent.update()
+                    stats.record(update_stats)
+                    n_updates += agent.gradient_steps
+                    counters[_N_UPDATES] = n_updates
+
+                    # Broadcast weights
+                    if n_updates % self.weights_sync_period < agent.gradient_steps:
+                        with lock:
+                            shared_q_network.load_state_dict(agent.q_network.state_dict())
+                            counters[_WEIGHTS_VERSION] += 1
+                else:
+                    for actor in actors:
+                        if actor.exitcode is not None and actor.exitcode != 0:
+                            raise RuntimeError(f"Actor process terminated with exit code {actor.exitcode}")
+                    time.sleep(self._poll_interval)
+        finally:
+            counters[_STOP] = 1
+            for actor in actors:
+                actor.join(timeout=10)
+                if actor.is_alive():
+                    actor.terminate()
+            agent._set_replay_buffer(private_replay_buffer)
+            private_replay_buffer.load_state_dict(replay_buffer.state_dict())
+            episodes.close()
+            stats.close()
+
+        return stats
+
+
+def _run_actor(
+        *,
+        environment: gym.Env | dict,
+        seed: int,
+        q_network: torch.nn.Module,
+        exploration: dict,
+        n_step: int,
+        discount: float,
+        replay_buffer,
+        replay_buffer_min: int,
+        replay_ratio: float,
+        max_pending_steps: int | None,
+        counters: torch.Tensor,
+        lock,
+        episode_queue
+) -> None:
+    torch.set_num_threads(1)    # the cores are shared with the learner and the other actors
+    if isinstance(environment, dict):
+        environment = make_environment(environment)
+    environment.seed(seed)
+    rng = np.random.RandomState(seed)
+    n_actions = environment.action_space.n
+    local_q_network = deepcopy(q_network)
+    n_step_accumulator = NStepAccumulator(n_steps=n_step, discount=discount)
+    weights_version = int(counters[_WEIGHTS_VERSION])
+
+    while not counters[_STOP]:
+        with lock:
+            counters[_N_EPISODES] += 1
+            episode = int(counters[_N_EPISODES])
+        epsilon = get_epsilon(episode=episode, **exploration)
+
+        done = False
+        state = environment.reset()
+        episode_reward = 0
+        episode_length = 0
+        while not done and not counters[_STOP]:
+            # Backpressure: wait for the learner if too many steps are pending
+            if max_pending_steps is not None:
+                while not counters[_STOP] and len(replay_buffer) >= replay_buffer_min and \
+                        int(counters[_N_STEPS]) - replay_buffer_min - int(counters[_N_UPDATES]) / replay_ratio > \
+                        max_pending_steps:
+                    time.sleep(ActorLearner._poll_interval)
+
+            # Refresh weights
+            if int(counters[_WEIGHTS_VERSION]) != weights_version:
+                with lock:
+                    local_q_network.load_state_dict(q_network.state_dict())
+                    weights_version = int(counters[_WEIGHTS_VERSION])
+
+            # Epsilon-greedy policy
+            if decide_random(rng, epsilon):
+                action = rng.choice(n_actions)
+            else:
+                with torch.no_grad():
+                    q = local_q_network(torch.as_tensor(state.reshape((1,) + state.shape), dtype=torch.float64))
+                    action = q.argmax().item()
+            next_state, reward, done, _ = environment.step(action)
+
+            experience = Experience(
+                episode=episode,
+                state=state,
+                action=action,
+                reward=reward,
+                next_state=next_state,
+                done=done
+            )
+            for n_step_experience in n_step_accumulator.append(experience):
+                replay_buffer.append(n_step_experience)
+            with lock:
+                counters[_N_STEPS] += 1
+
+            episode_reward += reward
+            episode_length += 1
+            state = next_state
+
+        if done:
+            episode_queue.put((episode_reward, episode_length))
+
+    environment.close()
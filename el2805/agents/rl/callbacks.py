@@ -0,0 +1,61 @@
+from el2805.agents.rl.metric_recorder import MetricRecorder
+from el2805.agents.rl.utils import Experience
+
+
+class Callback:
+    """Interface for the hooks called by RLAgent.train(). Subclasses override only the hooks they need: the training
+    loop dispatches each hook only to the callbacks overriding it, so hooks not overridden by any callback (in
+    particular the per-step ones) cost nothing."""
+
+    def on_step(self, agent, experience: Experience) -> None:
+        """Called after each interaction with the environment, once the experience has been recorded by the agent.
+
+        :param agent: agent being trained
+        :type agent: RLAgent
+        :param experience: new experience
+        :type experience: Experience
+        """
+
+    def on_update(self, agent, update_stats: dict) -> None:
+        """Called after each update of the agent (i.e., when update() returns some stats).
+
+        :param agent: agent being trained
+        :type agent: RLAgent
+        :param update_stats: statistics for the update
+        :type update_stats: dict
+        """
+
+    def on_episode_end(self, agent, episode: int, stats: MetricRecorder) -> bool | None:
+        """Called at the end of each episode, after its stats have been recorded.
+
+        :param agent: agent being trained
+        :type agent: RLAgent
+        :param episode: episode number (starting from 1)
+        :type episode: int
+        :param stats: training stats so far
+        :type stats: MetricRecorder
+        :return: True to stop training
+        :rtype: bool, optional
+        """
+
+    def on_train_end(self, agent, stats: MetricRecorder) -> None:
+        """Called at the end of training.
+
+        :param agent: agent being trained
+        :type agent: RLAgent
+        :param stats: training stats
+        :type stats: MetricRecorder
+        """
+
+
+def get_hook_callbacks(callbacks: list[Callback], hook: str) -> list[Callback]:
+    """Returns the callbacks that override the specified hook.
+
+    :param callbacks: callbacks
+    :type callbacks: list[Callback]
+    :param hook: name of the hook (e.g., "on_step")
+    :type hook: str
+    :return: callbacks overriding the hook
+    :rtype: list[Callback]
+    """
+    return [callback for callback in callbacks if getattr(type(callback), hook) is not getattr(Callback, hook)]
@@ -0,0 +1,98 @@
+import os
+import pickle
+import threading
+import time
+from pathlib import Path
+from el2805.agents.rl.callbacks import Callback
+from el2805.agents.rl.metric_recorder import MetricRecorder
+
+
+class Checkpointer(Callback):
+    """Callback saving a checkpoint of the training every some episodes and/or every some time, from which
+    RLAgent.train() can resume (see the resume_from parameter). A checkpoint contains the training state of the agent
+    (see RLAgent.state_dict()), the number of the last episode and the training stats. If the stats are stored on disk,
+    the checkpoint contains only the values not written yet (see MetricRecorder.state_dict()), so the training must
+    resume with a recorder using the same directory.
+
+    The checkpoint is serialized in the training loop, so that it is consistent, while writing it to disk is left to a
+    background thread. The file is replaced atomically, so a crash while writing leaves the previous checkpoint intact.
+    """
+
+    def __init__(self, filepath: str | Path, *, period: int | None = None, interval: float | None = None):
+        """Initializes a Checkpointer.
+
+        :param filepath: path where to save the checkpoint
+        :type filepath: str or Path
+        :param period: period for saving the checkpoint, expressed in number of episodes
+        :type period: int, optional
+        :param interval: minimum time between two checkpoints, expressed in seconds
+        :type interval: float, optional
+        """
+        assert period is not None or interval is not None
+        assert (period is None or period > 0) and (interval is None or interval > 0)
+        self.filepath = Path(filepath)
+        self.period = period
+        self.interval = interval
+        self._last_checkpoint_time = time.monotonic()
+        self._thread = None
+        self._exception = None
+
+    def on_episode_end(self, agent, episode: int, stats: MetricRecorder) -> None:
+        now = time.monotonic()
+        if (self.period is not None and episode % self.period == 0) or \
+                (self.interval is not None and now - self._last_checkpoint_time >= self.interval):
+            self.save(agent, episode, stats)
+            self._last_checkpoint_time = now
+
+    def on_train_end(self, agent, stats: MetricRecorder) -> None:
+        self.wait()
+
+    def save(self, agent, episode: int, stats: MetricRecorder) -> None:
+        """Saves a checkpoint in the background, after the previous one has been written.
+
+        :param agent: agent being trained
+        :type agent: RLAgent
+        :param episode: number of the last completed episode
+        :type episode: int
+        :param stats: training stats so far
+        :type stats: MetricRecorder
+        """
+        checkpoint = pickle.dumps({"episode": episode, "agent": agent.state_dict(), "stats": stats.state_dict()})
+        self.wait()
+        self._thread = threading.Thread(target=self._write, args=(checkpoint,), daemon=True)
+        self._thread.start()
+
+    def wait(self) -> None:
+        """Waits until the last checkpoint has been written, raising the error occurred while writing it, if any."""
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._exception is not None:
+            exception, self._exception = self._exception, None
+            raise exception
+
+    def _write(self, checkpoint: bytes) -> None:
+        try:
+            self.filepath.parent.mkdir(parents=True, exist_ok=True)
+            tmp_filepath = self.filepath.with_name(self.filepath.name + ".tmp")
+            with open(tmp_filepath, mode="wb") as file:
+                file.write(checkpoint)
+                file.flush()
+                os.fsync(file.fileno())
+            os.replace(tmp_filepath, self.filepath)
+        except Exception as exception:
+            self._exception = exception
+
+
+def load_checkpoint(filepath: str | Path) -> dict:
+    """Loads a checkpoint saved by a Checkpointer.
+
+    :param filepath: path where the checkpoint is saved
+    :type filepath: str or Path
+    :return: checkpoint, with the keys "episode" (number of the last completed episode), "agent" (training state of
+        the agent) and "stats" (state of the training stats)
+    :rtype: dict
+    """
+    with open(filepath, mode="rb") as file:
+        checkpoint = pickle.load(file)
+    return checkpoint
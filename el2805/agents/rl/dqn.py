@@ -1,16 +1,22 @@
 import gym
 import numpy as np
 import torch
-from collections import deque
 from copy import deepcopy
 from el2805.agents.rl.rl_agent import RLAgent
-from el2805.agents.rl.utils import Experience, get_epsilon, MultiLayerPerceptron
+from el2805.agents.rl.metric_recorder import MetricRecorder
+from el2805.agents.rl.actor_learner import ActorLearner
+from el2805.agents.rl.replay_buffer import ReplayBuffer, NStepAccumulator, MinibatchPrefetcher
+from el2805.agents.rl.utils import Experience, get_epsilon
+from el2805.agents.rl.torch_utils import compile_for_inference, MultiLayerPerceptron
 from el2805.utils import decide_random
 
 
 class DQN(RLAgent):
     """DQN (Deep Q-Network) agent."""
 
+    _replay_buffer_state_keys = ("replay_buffer", "n_step_accumulator", "prefetcher")
+    _optimizer_state_keys = ("optimizer",)
+
     def __init__(
             self,
             *,
@@ -32,6 +38,11 @@ class DQN(RLAgent):
             cer: bool,
             dueling: bool,
             device: str,
+            n_step: int = 1,
+            update_every: int = 1,
+            gradient_steps: int = 1,
+            prefetch: int = 0,
+            inference: str = "eager",
             seed: int | None = None
     ):
         """Initializes a DQN agent.
@@ -66,12 +77,26 @@ class DQN(RLAgent):
         :type hidden_layer_sizes: list[int]
         :param hidden_layer_activation: activation function for hidden layers in the Q-network
         :type hidden_layer_activation: str
-        :param cer: enables CER (combined experience replay)
+        :param cer: enables CER (combined experience replay). With prefetching, the latest experience included in each
+            mini-batch is the one at the time the mini-batch is sampled, that is, prefetch updates before it is used
         :type cer: bool
         :param dueling: enables dueling DQN
         :type dueling: bool
         :param device: device where to store and run neural networks (e.g., "cpu")
         :type device: str
+        :param n_step: number of steps of the returns used as targets (n-step DQN)
+        :type n_step: int, optional
+        :param update_every: period for updating the Q-network, expressed in number of steps
+        :type update_every: int, optional
+        :param gradient_steps: number of gradient steps (each one with a new mini-batch) for each update
+        :type gradient_steps: int, optional
+        :param prefetch: number of updates whose mini-batches are prepared in advance by a background thread, 0
+            disables prefetching
+        :type prefetch: int, optional
+        :param inference: how the Q-network is run to compute actions, "eager", "trace" (TorchScript, sharing the
+            weights with the Q-network), or "frozen" (TorchScript with constant weights, compiled again after each
+            update, best for testing)
+        :type inference: str, optional
         :param seed: seed
         :type seed: int, optional
         """
@@ -93,6 +118,11 @@ class DQN(RLAgent):
         self.cer = cer
         self.dueling = dueling
         self.device = device
+        self.n_step = n_step
+        self.update_every = update_every
+        self.gradient_steps = gradient_steps
+        self.prefetch = prefetch
+        self.inference = inference
 
         assert isinstance(environment.observation_space, gym.spaces.Box)
         state_dim = len(environment.observation_space.low)
@@ -108,83 +138,155 @@ class DQN(RLAgent):
         ).double().to(self.device)
 
         self._target_q_network = deepcopy(self.q_network).to(self.device)
-        self._replay_buffer = deque(maxlen=self.replay_buffer_size)
+        self._replay_buffer = ReplayBuffer(capacity=self.replay_buffer_size, state_dim=state_dim)
+        self._n_step_accumulator = NStepAccumulator(
+            n_steps=self.n_step,
+            discount=self.discount
+        ) if self.n_step > 1 else None
+        self._prefetcher = MinibatchPrefetcher(
+            replay_buffer=self._replay_buffer,
+            device=self.device,
+            n_prefetch=self.prefetch
+        ) if self.prefetch > 0 else None
         self._optimizer = torch.optim.Adam(self.q_network.parameters(), lr=self.learning_rate)
+        self._n_steps = 0
         self._n_updates = 0
+        self._inference_q_network = None     # compiled at the first use
 
     def update(self) -> dict:
         stats = {}
 
-        # Skip update if buffer does not contain enough experiences
-        if len(self._replay_buffer) < self.replay_buffer_min:
+        # Skip update if buffer does not contain enough experiences or if it is not the time to update
+        self._n_steps = (self._n_steps + 1) % self.update_every
+        if len(self._replay_buffer) < self.replay_buffer_min or self._n_steps != 0:
             return stats
 
         # Enable training mode
         self.q_network.train()
+        profiler = self._profiler
+        if profiler is not None:
+            t = profiler.tic()
 
-        # Sample mini-batch of experiences
-        experience_indices = self._rng.choice(len(self._replay_buffer), size=self.batch_size)
-        experience_batch = [self._replay_buffer[i] for i in experience_indices]
-        if self.cer:
-            experience_batch[-1] = self._replay_buffer[-1]
-
-        # Unpack experiences
-        states = torch.as_tensor(
-            data=np.asarray([e.state for e in experience_batch]),
-            dtype=torch.float64,
-            device=self.device
-        )
-        actions = torch.as_tensor(
-            data=np.asarray([e.action for e in experience_batch]),
-            dtype=torch.long,
-            device=self.device
-        )
-        next_states = torch.as_tensor(
-            data=np.asarray([e.next_state for e in experience_batch]),
-            dtype=torch.float64,
-            device=self.device,
-        )
-        rewards = torch.as_tensor(
-            data=[e.reward for e in experience_batch],
-            dtype=torch.float64,
-            device=self.device
-        )
-        dones = torch.as_tensor(
-            data=[e.done for e in experience_batch],
-            dtype=torch.bool,
-            device=self.device
+        # Sample mini-batches of experiences for all the gradient steps at once
+        if self._prefetcher is None:
+            minibatches = self._replay_buffer.sample(self._rng, self.batch_size, self.cer, self.gradient_steps)
+            minibatches = tuple(tensor.to(self.device) for tensor in minibatches)
+        else:
+            while len(self._prefetcher) <= self.prefetch:
+                self._prefetcher.put(
+                    self._replay_buffer.sample_indices(self._rng, self.batch_size, self.cer, self.gradient_steps)
+                )
+            minibatches = self._prefetcher.get()
+        if profiler is not None:
+            profiler.toc("update_sample", t)
+
+        # Gradient steps
+        losses = [self._gradient_step(*minibatch) for minibatch in zip(*minibatches)]
+
+        # Disable training mode
+        self.q_network.eval()
+
+        # Save stats
+        stats["loss"] = losses
+        return stats
+
+    def train_async(
+            self,
+            n_episodes: int,
+            *,
+            n_actors: int,
+            replay_ratio: float = 1,
+            weights_sync_period: int = 1,
+            max_pending_steps: int | None = None,
+            early_stop_reward: float | None = None,
+            seed: int | None = None,
+            metrics: MetricRecorder | None = None
+    ) -> MetricRecorder:
+        """Trains the agent in actor/learner mode, where several actor processes interact with their own copy of the
+        environment while this process updates the Q-network. See ActorLearner.
+
+        :param n_episodes: number of training episodes
+        :type n_episodes: int
+        :param n_actors: number of actor processes
+        :type n_actors: int
+        :param replay_ratio: number of updates per environment step
+        :type replay_ratio: float, optional
+        :param weights_sync_period: period for broadcasting the weights to the actors, expressed in number of updates
+        :type weights_sync_period: int, optional
+        :param max_pending_steps: maximum number of environment steps that the actors can take ahead of the learner,
+            if None the actors never wait
+        :type max_pending_steps: int, optional
+        :param early_stop_reward: average reward considered as problem solved
+        :type early_stop_reward: float, optional
+        :param seed: seed used to generate the seeds of the actors, if None it is drawn from the agent's RNG
+        :type seed: int, optional
+        :param metrics: recorder where to store the training stats, if None they are kept in memory
+        :type metrics: MetricRecorder, optional
+        :return: training stats (per episode or per update, depending on the metric)
+        :rtype: MetricRecorder
+        """
+        actor_learner = ActorLearner(
+            self,
+            n_actors=n_actors,
+            replay_ratio=replay_ratio,
+            weights_sync_period=weights_sync_period,
+            max_pending_steps=max_pending_steps,
+            seed=seed if seed is not None else self._rng.randint(np.iinfo(np.int32).max)
         )
+        stats = actor_learner.train(n_episodes=n_episodes, early_stop_reward=early_stop_reward, metrics=metrics)
+        return stats
+
+    def record_experience(self, experience: Experience) -> None:
+        if self._prefetcher is not None:
+            self._prefetcher.synchronize()     # the pending mini-batches must be gathered before the buffer changes
+        if self._n_step_accumulator is not None:
+            for n_step_experience in self._n_step_accumulator.append(experience):
+                self._replay_buffer.append(n_step_experience)
+        else:
+            self._replay_buffer.append(experience)
+
+    def _gradient_step(
+            self,
+            states: torch.Tensor,
+            actions: torch.Tensor,
+            rewards: torch.Tensor,
+            next_states: torch.Tensor,
+            dones: torch.Tensor
+    ) -> float:
+        profiler = self._profiler
+        if profiler is not None:
+            t = profiler.tic()
 
         # Compute targets
         with torch.no_grad():
             q_next = self._target_q_network(next_states)    # Q(s',a)
-            targets = rewards + dones.logical_not() * self.discount * q_next.max(axis=1).values
+            targets = rewards + dones.logical_not() * self.discount ** self.n_step * q_next.max(axis=1).values
 
         # Forward pass
         q = self.q_network(states)                          # Q(s,a)
         q = q[torch.arange(self.batch_size), actions]       # Q(s,a*), where a* is the action taken in the experience
         loss = torch.nn.functional.mse_loss(targets, q)
+        if profiler is not None:
+            t = profiler.toc("update_forward", t)
 
         # Backward pass
         self._optimizer.zero_grad()
         loss.backward()
         torch.nn.utils.clip_grad_norm_(self.q_network.parameters(), max_norm=self.gradient_max_norm)
         self._optimizer.step()
+        if self.inference == "frozen":
+            self._inference_q_network = None
+        if profiler is not None:
+            t = profiler.toc("update_backward", t)
 
         # Update target network
         self._n_updates = (self._n_updates + 1) % self.target_update_period
         if self._n_updates == 0:
             self._target_q_network = deepcopy(self.q_network)
+            if profiler is not None:
+                profiler.toc("update_target_sync", t)
 
-        # Disable training mode
-        self.q_network.eval()
-
-        # Save stats
-        stats["loss"] = loss.item()
-        return stats
-
-    def record_experience(self, experience: Experience) -> None:
-        self._replay_buffer.append(experience)
+        return loss.item()
 
     def compute_action(
             self,
@@ -214,20 +316,69 @@ class DQN(RLAgent):
         if explore and decide_random(self._rng, epsilon):   # exploration (probability eps)
             action = self._rng.choice(self._n_actions)
         else:                                               # exploitation (probability 1-eps)
-            with torch.no_grad():
+            with torch.inference_mode():
                 state = torch.as_tensor(
                     data=state.reshape((1,) + state.shape),
                     dtype=torch.float64,
                     device=self.device
                 )
-                q = self.q_network(state)
+                q = self._get_inference_q_network()(state)
                 assert q.shape == (1, self._n_actions)
                 action = q.argmax().item()
 
         return action
 
+    def state_dict(self) -> dict:
+        state = super().state_dict()
+        state["q_network"] = self.q_network.state_dict()
+        state["target_q_network"] = self._target_q_network.state_dict()
+        state["optimizer"] = self._optimizer.state_dict()
+        state["replay_buffer"] = self._replay_buffer.state_dict()
+        state["n_step_accumulator"] = (
+            self._n_step_accumulator.state_dict() if self._n_step_accumulator is not None else None
+        )
+        state["prefetcher"] = self._prefetcher.state_dict() if self._prefetcher is not None else None
+        state["n_steps"] = self._n_steps
+        state["n_updates"] = self._n_updates
+        return state
+
+    def load_state_dict(self, state: dict) -> None:
+        super().load_state_dict(state)
+        self.q_network.load_state_dict(state["q_network"])
+        self._target_q_network.load_state_dict(state["target_q_network"])
+        self._optimizer.load_state_dict(state["optimizer"])
+        self._replay_buffer.load_state_dict(state["replay_buffer"])
+        if self._n_step_accumulator is not None:
+            self._n_step_accumulator.load_state_dict(state["n_step_accumulator"])
+        if self._prefetcher is not None:
+            self._prefetcher.load_state_dict(state["prefetcher"])
+        self._n_steps = state["n_steps"]
+        self._n_updates = state["n_updates"]
+        self._inference_q_network = None
+
+    def __getstate__(self) -> dict:
+        # compiled modules cannot be pickled, they are compiled again at the first use
+        state = self.__dict__.copy()
+        state["_inference_q_network"] = None
+        return state
+
+    def _set_replay_buffer(self, replay_buffer: ReplayBuffer) -> None:
+        # the pending mini-batches are gathered from the previous buffer
+        if self._prefetcher is not None:
+            self._prefetcher.synchronize()
+            self._prefetcher.replay_buffer = replay_buffer
+        self._replay_buffer = replay_buffer
+
+    def _get_inference_q_network(self) -> torch.nn.Module:
+        if self._inference_q_network is None:
+            example_input = torch.zeros((1, self.q_network.state_dim), dtype=torch.float64, device=self.device)
+            self._inference_q_network = compile_for_inference(self.q_network, example_input, self.inference)
+        return self._inference_q_network
+
 
 class QNetwork(torch.nn.Module):
+    input_dtype = torch.float64     # the inputs are cast to the dtype of the weights (float32 once quantized)
+
     def __init__(
             self,
             *,
@@ -262,7 +413,7 @@ class QNetwork(torch.nn.Module):
             self._output_layer = torch.nn.Linear(input_size, self.n_actions)
 
     def forward(self, x):
-        x = x.to(torch.float64)
+        x = x.to(self.input_dtype)
         x = self._hidden_layers(x)
         if self.dueling:
             v = self._v_layer(x)
@@ -272,3 +423,20 @@ class QNetwork(torch.nn.Module):
         else:
             q = self._output_layer(x)
         return q
+
+
+def quantize_q_network(q_network: QNetwork) -> QNetwork:
+    """Exports a copy of a Q-network for acting on CPU, with dynamic int8 quantization of the linear layers. The weights
+    are stored as int8, and the activations are quantized on the fly, so the quantized Q-network is much smaller, but
+    its Q-values are approximate. For small networks, it is not faster than the original one, because of the
+    quantization overhead. The original Q-network is not modified.
+
+    :param q_network: Q-network to quantize (dueling or not)
+    :type q_network: QNetwork
+    :return: quantized Q-network, which takes states of any floating dtype and returns float32 Q-values
+    :rtype: QNetwork
+    """
+    quantized = deepcopy(q_network).cpu().float().eval()
+    quantized.input_dtype = torch.float32   # dynamic quantization supports float32 activations only
+    torch.ao.quantization.quantize_dynamic(quantized, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+    return quantized
@@ -0,0 +1,277 @@
+import json
+import numpy as np
+from collections.abc import Iterable, Mapping
+from pathlib import Path
+
+_HEADER_FILENAME = "metrics.json"
+_DTYPE = np.dtype("<f8")
+
+
+class MetricRecorder(Mapping):
+    """Training statistics stored as columns of float64 values, one per metric, which grow by preallocated chunks.
+
+    If a directory is given, each full chunk is appended to a binary file per metric and released, so that memory stays
+    bounded on long runs. A JSON header describes the columns, and the files can be read back lazily with
+    load_metrics(). Otherwise, the chunks are kept in memory.
+
+    The specified metrics (e.g., per-update losses) can be aggregated by averaging blocks of consecutive values, which
+    reduces their size by the aggregation period.
+
+    Reading a metric returns a NumPy array (a read-only memory map of the file, if stored on disk), which is empty for
+    metrics that have not been recorded (e.g., losses before the first update).
+    """
+
+    def __init__(
+            self,
+            directory: str | Path | None = None,
+            *,
+            chunk_size: int = 4096,
+            aggregation_period: int = 1,
+            aggregated_metrics: Iterable[str] = ()
+    ):
+        """Initializes a MetricRecorder.
+
+        :param directory: directory where to store the metrics, if None they are kept in memory
+        :type directory: str or Path, optional
+        :param chunk_size: number of values per chunk (i.e., values of a metric kept in memory before writing them)
+        :type chunk_size: int, optional
+        :param aggregation_period: number of consecutive values of the aggregated metrics averaged into one value
+        :type aggregation_period: int, optional
+        :param aggregated_metrics: names of the metrics to aggregate (the other metrics are recorded as they are)
+        :type aggregated_metrics: Iterable[str], optional
+        """
+        assert chunk_size > 0 and aggregation_period > 0
+        self.directory = Path(directory) if directory is not None else None
+        self.chunk_size = chunk_size
+        self.aggregation_period = aggregation_period
+        self.aggregated_metrics = frozenset(aggregated_metrics)
+        self._columns = {}
+
+        if self.directory is not None:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            self._write_header()
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        if name not in self._columns:
+            return np.zeros(0, dtype=_DTYPE)
+        column = self._columns[name]
+        if self.directory is None:
+            return np.concatenate(column["chunks"] + [column["chunk"][:column["n_chunk"]]])
+        else:
+            self._flush_column(name)
+            self._write_header()
+            return _read_column(self.directory / _column_filename(name), column["length"])
+
+    def __contains__(self, name) -> bool:
+        return name in self._columns
+
+    def __iter__(self):
+        return iter(self._columns)
+
+    def __len__(self) -> int:
+        return len(self._columns)
+
+    def n_values(self, name: str) -> int:
+        """Returns the number of values recorded for a metric, without reading them.
+
+        :param name: name of the metric
+        :type name: str
+        :return: number of values (0 if the metric has not been recorded yet)
+        :rtype: int
+        """
+        return self._columns[name]["length"] if name in self._columns else 0
+
+    def append(self, name: str, value: float) -> None:
+        """Records a new value of a metric.
+
+        :param name: name of the metric
+        :type name: str
+        :param value: new value
+        :type value: float
+        """
+        if name not in self._columns:
+            self._add_column(name)
+        column = self._columns[name]
+
+        # Aggregation of per-update metrics
+        if column["aggregated"]:
+            column["pending_sum"] += value
+            column["n_pending"] += 1
+            if column["n_pending"] < self.aggregation_period:
+                return
+            value = column["pending_sum"] / column["n_pending"]
+            column["pending_sum"] = 0
+            column["n_pending"] = 0
+
+        self._write_value(name, value)
+
+    def extend(self, name: str, values) -> None:
+        """Records several new values of a metric.
+
+        :param name: name of the metric
+        :type name: str
+        :param values: new values
+        :type values: iterable of float
+        """
+        for value in values:
+            self.append(name, value)
+
+    def record(self, stats: dict) -> None:
+        """Records the stats returned by an update, where each metric has a single value or a list of values.
+
+        :param stats: stats to record
+        :type stats: dict
+        """
+        for name, value in stats.items():
+            if isinstance(value, list):
+                self.extend(name, value)
+            else:
+                self.append(name, value)
+
+    def flush(self) -> None:
+        """Writes the values recorded so far to the directory (no effect if the metrics are kept in memory)."""
+        if self.directory is not None:
+            for name in self._columns:
+                self._flush_column(name)
+            self._write_header()
+
+    def close(self) -> None:
+        """Records the partial blocks of the aggregated metrics and writes all the values to the directory."""
+        for name, column in self._columns.items():
+            if column["aggregated"] and column["n_pending"] > 0:
+                self._write_value(name, column["pending_sum"] / column["n_pending"])
+                column["pending_sum"] = 0
+                column["n_pending"] = 0
+        self.flush()
+
+    def state_dict(self) -> dict:
+        """Returns the state of the recorder, including the partial blocks of the aggregated metrics.
+
+        In memory mode, the state contains all the values recorded so far. If the metrics are stored on disk, the
+        state contains only the number of values in the full chunks (already written) and the values of the current
+        chunk, so its size is bounded by the chunk size.
+
+        :return: state of the recorder
+        :rtype: dict
+        """
+        state = {}
+        for name, column in self._columns.items():
+            if self.directory is None:
+                column_state = {"values": np.array(self[name])}
+            else:
+                column_state = {
+                    "n_written": column["length"] - column["n_chunk"],
+                    "values": column["chunk"][:column["n_chunk"]].copy()
+                }
+            column_state["pending_sum"] = column["pending_sum"]
+            column_state["n_pending"] = column["n_pending"]
+            state[name] = column_state
+        return state
+
+    def load_state_dict(self, state: dict) -> None:
+        """Records the values of a state returned by state_dict(), as they are (i.e., without aggregating them again).
+        The recorder must be empty.
+
+        If the metrics are stored on disk, the recorder must use the directory of the recorder that returned the state.
+        The files are truncated to the values written when the state was taken, discarding those written afterwards
+        (e.g., after the checkpoint from which the training resumes).
+
+        :param state: state of a recorder with the same aggregation period and chunk size
+        :type state: dict
+        """
+        assert len(self._columns) == 0
+        for name, column_state in state.items():
+            assert ("n_written" in column_state) == (self.directory is not None)
+            self._add_column(name, n_written=column_state.get("n_written", 0))
+            for value in column_state["values"]:
+                self._write_value(name, value)
+            self._columns[name]["pending_sum"] = column_state["pending_sum"]
+            self._columns[name]["n_pending"] = column_state["n_pending"]
+
+    def _add_column(self, name: str, n_written: int = 0) -> None:
+        self._columns[name] = {
+            "chunks": [],                                   # full chunks (kept only in memory mode)
+            "chunk": np.zeros(self.chunk_size, dtype=_DTYPE),
+            "n_chunk": 0,                                   # values in the current chunk
+            "n_flushed": 0,                                 # values of the current chunk already written
+            "length": n_written,
+            "aggregated": name in self.aggregated_metrics and self.aggregation_period > 1,
+            "pending_sum": 0,
+            "n_pending": 0
+        }
+        if self.directory is not None:
+            # Keep only the values already written (none for a new column)
+            with open(self.directory / _column_filename(name), mode="ab") as file:
+                size = n_written * _DTYPE.itemsize
+                assert file.tell() >= size, f"missing values in the file of {name}"
+                file.truncate(size)
+            self._write_header()
+
+    def _write_value(self, name: str, value: float) -> None:
+        column = self._columns[name]
+        column["chunk"][column["n_chunk"]] = value
+        column["n_chunk"] += 1
+        column["length"] += 1
+
+        # Release full chunk
+        if column["n_chunk"] == self.chunk_size:
+            if self.directory is None:
+                column["chunks"].append(column["chunk"])
+                column["chunk"] = np.zeros(self.chunk_size, dtype=_DTYPE)
+            else:
+                self._flush_column(name)
+                self._write_header()
+            column["n_chunk"] = 0
+            column["n_flushed"] = 0
+
+    def _flush_column(self, name: str) -> None:
+        column = self._columns[name]
+        if column["n_flushed"] < column["n_chunk"]:
+            with open(self.directory / _column_filename(name), mode="ab") as file:
+                file.write(column["chunk"][column["n_flushed"]:column["n_chunk"]].tobytes())
+            column["n_flushed"] = column["n_chunk"]
+
+    def _write_header(self) -> None:
+        header = {
+            "dtype": _DTYPE.str,
+            "aggregation_period": self.aggregation_period,
+            "columns": {
+                name: {
+                    "filename": _column_filename(name),
+                    "length": column["length"] - column["n_chunk"] + column["n_flushed"],  # values written
+                    "aggregated": column["aggregated"]
+                }
+                for name, column in self._columns.items()
+            }
+        }
+        with open(self.directory / _HEADER_FILENAME, mode="w") as file:
+            json.dump(header, file, indent=4)
+
+
+def load_metrics(directory: str | Path) -> dict[str, np.ndarray]:
+    """Reads the metrics written by a MetricRecorder. The values are memory-mapped, so they are read from disk only
+    when accessed.
+
+    :param directory: directory where the metrics are stored
+    :type directory: str or Path
+    :return: values of each metric (read-only)
+    :rtype: dict[str, np.ndarray]
+    """
+    directory = Path(directory)
+    with open(directory / _HEADER_FILENAME) as file:
+        header = json.load(file)
+    assert np.dtype(header["dtype"]) == _DTYPE
+    return {
+        name: _read_column(directory / column["filename"], column["length"])
+        for name, column in header["columns"].items()
+    }
+
+
+def _column_filename(name: str) -> str:
+    return f"{name}.f64"
+
+
+def _read_column(filepath: Path, length: int) -> np.ndarray:
+    if length == 0:
+        return np.zeros(0, dtype=_DTYPE)
+    return np.memmap(filepath, dtype=_DTYPE, mode="r", shape=(length,))
@@ -3,12 +3,20 @@ import numpy as np
 import torch
 from collections import defaultdict
 from el2805.agents.rl.rl_agent import RLAgent
-from el2805.agents.rl.utils import Experience, MultiLayerPerceptron, normal_pdf
+from el2805.agents.rl.metric_recorder import MetricRecorder
+from el2805.agents.rl.utils import Experience
+from el2805.agents.rl.torch_utils import MultiLayerPerceptron, compile_for_inference, normal_log_pdf
+from el2805.agents.rl.rollout_storage import RolloutStorage
+from el2805.agents.rl.rollout_workers import RolloutWorkers
+from el2805.agents.rl.returns import discounted_returns, generalized_advantage_estimation
 
 
 class PPO(RLAgent):
     """PPO (Proximal Policy Optimization) agent."""
 
+    _replay_buffer_state_keys = ("rollout_storage", "last_action")
+    _optimizer_state_keys = ("actor_critic_optimizer", "critic_optimizer", "actor_optimizer")
+
     def __init__(
             self,
             *,
@@ -26,6 +34,13 @@ class PPO(RLAgent):
             actor_hidden_layer_activation: str,
             gradient_max_norm: float,
             device: str,
+            gae_lambda: float | None = None,
+            rollout_length: int | None = None,
+            minibatch_size: int | None = None,
+            target_kl: float | None = None,
+            shared_network: bool = False,
+            value_loss_coefficient: float = 0.5,
+            inference: str = "eager",
             seed: int | None = None
     ):
         super().__init__(environment=environment, seed=seed)
@@ -42,138 +57,472 @@ class PPO(RLAgent):
         self.actor_hidden_layer_activation = actor_hidden_layer_activation
         self.gradient_max_norm = gradient_max_norm
         self.device = device
+        self.gae_lambda = gae_lambda            # None for Monte Carlo advantages
+        self.rollout_length = rollout_length    # None for updating at the end of each episode
+        self.minibatch_size = minibatch_size    # None for full-batch epochs
+        self.target_kl = target_kl              # None for running all the actor epochs
+        self.shared_network = shared_network    # True for a critic head on top of the shared hidden layers of the actor
+        self.value_loss_coefficient = value_loss_coefficient    # weight of the critic loss, only with shared network
+        self.inference = inference              # "eager", "trace" or "frozen" (see compile_for_inference)
 
         assert isinstance(environment.observation_space, gym.spaces.Box)
         state_dim = len(environment.observation_space.low)
+        self._state_dim = state_dim
         assert isinstance(environment.action_space, gym.spaces.Box)
         self._action_dim = len(environment.action_space.low)
 
-        self.critic = PPOCritic(
-            state_dim=state_dim,
-            hidden_layer_sizes=self.critic_hidden_layer_sizes,
-            hidden_layer_activation=self.critic_hidden_layer_activation
-        ).double().to(self.device)
+        if self.shared_network:
+            # One network with policy and value heads, trained with a combined loss and a single optimizer
+            # The actor and the critic are views of the same network
+            self.actor = PPOActorCritic(
+                state_dim=state_dim,
+                action_dim=self._action_dim,
+                shared_hidden_layer_sizes=self.actor_shared_hidden_layer_sizes,
+                mean_hidden_layer_sizes=self.actor_mean_hidden_layer_sizes,
+                var_hidden_layer_sizes=self.actor_var_hidden_layer_sizes,
+                value_hidden_layer_sizes=self.critic_hidden_layer_sizes,
+                hidden_layer_activation=self.actor_hidden_layer_activation,
+                value_hidden_layer_activation=self.critic_hidden_layer_activation
+            ).double().to(self.device)
+            self.critic = PPOValueView(self.actor)
+
+            self._actor_critic_optimizer = torch.optim.Adam([
+                {"params": self.actor.policy_parameters(), "lr": self.actor_learning_rate},
+                {"params": self.actor.value_parameters(), "lr": self.critic_learning_rate}
+            ])
+        else:
+            self.critic = PPOCritic(
+                state_dim=state_dim,
+                hidden_layer_sizes=self.critic_hidden_layer_sizes,
+                hidden_layer_activation=self.critic_hidden_layer_activation
+            ).double().to(self.device)
+
+            self.actor = PPOActor(
+                state_dim=state_dim,
+                action_dim=self._action_dim,
+                shared_hidden_layer_sizes=self.actor_shared_hidden_layer_sizes,
+                mean_hidden_layer_sizes=self.actor_mean_hidden_layer_sizes,
+                var_hidden_layer_sizes=self.actor_var_hidden_layer_sizes,
+                hidden_layer_activation=self.actor_hidden_layer_activation
+            ).double().to(self.device)
 
-        self.actor = PPOActor(
+            self._critic_optimizer = torch.optim.Adam(self.critic.parameters(), lr=self.critic_learning_rate)
+            self._actor_optimizer = torch.optim.Adam(self.actor.parameters(), lr=self.actor_learning_rate)
+        self._rollout_storage = RolloutStorage(
             state_dim=state_dim,
             action_dim=self._action_dim,
-            shared_hidden_layer_sizes=self.actor_shared_hidden_layer_sizes,
-            mean_hidden_layer_sizes=self.actor_mean_hidden_layer_sizes,
-            var_hidden_layer_sizes=self.actor_var_hidden_layer_sizes,
-            hidden_layer_activation=self.actor_hidden_layer_activation
-        ).double().to(self.device)
-
-        self._critic_optimizer = torch.optim.Adam(self.critic.parameters(), lr=self.critic_learning_rate)
-        self._actor_optimizer = torch.optim.Adam(self.actor.parameters(), lr=self.actor_learning_rate)
-        self._episodic_buffer = []
+            capacity=self.rollout_length if self.rollout_length is not None else 1024
+        )
+        self._last_action = None    # (action, log-likelihood, value or None) of the last action computed
+        self._inference_actor = None    # compiled at the first use
 
     def update(self) -> dict:
         stats = defaultdict(list)
 
-        # Skip update if the episode has not terminated
-        if not self._episodic_buffer[-1].done:
+        # Skip update if the episode has not terminated (or, in rollout mode, if the rollout is not complete)
+        if self.rollout_length is None and not self._rollout_storage.last_done:
+            return stats
+        if self.rollout_length is not None and len(self._rollout_storage) < self.rollout_length:
             return stats
 
-        # Unpack experiences
-        n = len(self._episodic_buffer)
-        rewards = torch.as_tensor(
-            data=np.asarray([e.reward for e in self._episodic_buffer]),
-            dtype=torch.float64,
-            device=self.device
+        # Unpack experiences (views of the storage, no copy on CPU)
+        states, actions, rewards, dones, log_probs, values = (
+            tensor.to(self.device) if tensor is not None else None
+            for tensor in self._rollout_storage.tensors()
         )
-        states = torch.as_tensor(
-            data=np.asarray([e.state for e in self._episodic_buffer]),
-            dtype=torch.float64,
-            device=self.device
-        )
-        actions = torch.as_tensor(
-            data=np.asarray([e.action for e in self._episodic_buffer]),
+
+        # In rollout mode, the last episode might not be over
+        truncated = torch.zeros_like(dones)
+        truncated[-1] = not self._rollout_storage.last_done
+        truncated_next_states = torch.as_tensor(
+            data=np.asarray([] if self._rollout_storage.last_done else [self._rollout_storage.last_next_state]),
             dtype=torch.float64,
             device=self.device
+        ).reshape(-1, self._state_dim)
+
+        stats = self._update_from_rollout(
+            states=states,
+            actions=actions,
+            rewards=rewards,
+            dones=dones,
+            log_probs=log_probs,
+            truncated=truncated,
+            truncated_next_states=truncated_next_states,
+            values=values
         )
 
-        # Compute Monte Carlo targets
-        g = []
-        discounted_reward = 0
-        for r in reversed(rewards):
-            discounted_reward = r + self.discount * discounted_reward
-            g.append(discounted_reward)
-        g = torch.as_tensor(
-            np.asarray(g[::-1]),    # reverse
-            dtype=torch.float64,
-            device=self.device
+        # Clear storage for new episode (or rollout)
+        self._rollout_storage.clear()
+
+        return stats
+
+    def train_parallel(
+            self,
+            n_episodes: int,
+            *,
+            n_workers: int,
+            early_stop_reward: float | None = None,
+            seed: int | None = None,
+            metrics: MetricRecorder | None = None
+    ) -> MetricRecorder:
+        """Trains the agent with several worker processes collecting rollouts in parallel, each with its own copy of
+        the environment, while this process updates the networks. See RolloutWorkers.
+
+        :param n_episodes: number of training episodes
+        :type n_episodes: int
+        :param n_workers: number of worker processes
+        :type n_workers: int
+        :param early_stop_reward: average reward considered as problem solved
+        :type early_stop_reward: float, optional
+        :param seed: seed used to generate the seeds of the workers, if None it is drawn from the agent's RNG
+        :type seed: int, optional
+        :param metrics: recorder where to store the training stats, if None they are kept in memory
+        :type metrics: MetricRecorder, optional
+        :return: training stats (per episode or per update, depending on the metric)
+        :rtype: MetricRecorder
+        """
+        rollout_workers = RolloutWorkers(
+            self,
+            n_workers=n_workers,
+            seed=seed if seed is not None else self._rng.randint(np.iinfo(np.int32).max)
         )
-        assert g.shape == (n,)
+        stats = rollout_workers.train(n_episodes=n_episodes, early_stop_reward=early_stop_reward, metrics=metrics)
+        return stats
+
+    def _update_from_rollout(
+            self,
+            *,
+            states,
+            actions,
+            rewards,
+            dones,
+            log_probs,
+            truncated,
+            truncated_next_states,
+            values=None
+    ):
+        # The rollout is a concatenation of trajectories, each ending with a terminal step (done) or a truncated step,
+        # whose next state is used to bootstrap. Possibly several episodes and several workers.
+        stats = defaultdict(list)
+        n = len(states)
+        assert states.shape == (n, self._state_dim) and actions.shape == (n, self._action_dim)
+        assert rewards.shape == (n,) and dones.shape == (n,) and log_probs.shape == (n,) and truncated.shape == (n,)
+        assert truncated_next_states.shape == (int(truncated.sum()), self._state_dim)
 
         with torch.no_grad():
-            # Compute advantages
-            v = self.critic(states)
-            assert v.shape == (n, 1)
-            v = v.reshape(-1)
-            psi = g - v
+            # Bootstrap the truncated trajectories by folding the value of the next state into the last reward, so
+            # that each trajectory ends at a terminal step
+            if truncated.any():
+                rewards = rewards.clone()
+                rewards[truncated] += self.discount * self.critic(truncated_next_states).reshape(-1)
+                dones = dones.logical_or(truncated)
+
+            # Compute targets and advantages (Monte Carlo or GAE), with the values computed at collection time if any
+            if values is None:
+                v = self.critic(states)
+                assert v.shape == (n, 1)
+                v = v.reshape(-1)
+            else:
+                v = values
+            if self.gae_lambda is None:
+                g = discounted_returns(rewards, self.discount, dones)
+                psi = g - v
+            else:
+                psi, g = generalized_advantage_estimation(rewards, v, self.discount, self.gae_lambda, dones)
+            assert g.shape == (n,) and psi.shape == (n,)
 
-            # Compute action likelihood from old policy
-            pi_old = self._compute_actions_likelihood(states, actions)
+            # Action log-likelihood from old policy (cached at collection time)
+            logp_old = log_probs
 
+        update_actor = True
         for _ in range(self.n_epochs_per_step):
-            # Forward pass by critic
-            v = self.critic(states)
-            assert v.shape == (n, 1)
-            v = v.reshape(-1)
-            critic_loss = torch.nn.functional.mse_loss(g, v)
-
-            # Backward pass by critic
-            self._critic_optimizer.zero_grad()
-            critic_loss.backward()
-            torch.nn.utils.clip_grad_norm_(self.critic.parameters(), max_norm=self.gradient_max_norm)
-            self._critic_optimizer.step()
-
-            # Forward pass by actor
-            pi = self._compute_actions_likelihood(states, actions)
-            r = pi / pi_old
-            assert r.shape == (n,)
-            r_clipped = r.clip(min=1-self.epsilon, max=1 + self.epsilon)
-            assert r_clipped.shape == (n,)
-            actor_loss = - torch.minimum(r * psi, r_clipped * psi).mean()
-
-            # Backward pass by actor
-            self._actor_optimizer.zero_grad()
-            actor_loss.backward()
-            torch.nn.utils.clip_grad_norm_(self.actor.parameters(), max_norm=self.gradient_max_norm)
-            self._actor_optimizer.step()
-
-            # Save stats
-            stats["critic_loss"].append(critic_loss.item())
-            stats["actor_loss"].append(actor_loss.item())
-
-        # Clear episodic buffer for new episode
-        self._episodic_buffer = []
+            # Shuffle experiences into mini-batches (or use the full batch)
+            if self.minibatch_size is None:
+                minibatches = [slice(None)]
+            else:
+                permutation = torch.as_tensor(self._rng.permutation(n), device=self.device)
+                minibatches = permutation.split(self.minibatch_size)
+
+            epoch_kl = []
+            for minibatch in minibatches:
+                if self.shared_network:
+                    critic_loss, actor_stats = self._actor_critic_step(
+                        states=states[minibatch],
+                        actions=actions[minibatch],
+                        g=g[minibatch],
+                        psi=psi[minibatch],
+                        logp_old=logp_old[minibatch],
+                        update_actor=update_actor
+                    )
+                else:
+                    critic_loss = self._critic_step(states=states[minibatch], g=g[minibatch])
+                    actor_stats = None
+                    if update_actor:
+                        actor_stats = self._actor_step(
+                            states=states[minibatch],
+                            actions=actions[minibatch],
+                            psi=psi[minibatch],
+                            logp_old=logp_old[minibatch]
+                        )
+                stats["critic_loss"].append(critic_loss)
+
+                if actor_stats is not None:
+                    actor_loss, approx_kl, clip_fraction = actor_stats
+                    stats["actor_loss"].append(actor_loss)
+                    stats["approx_kl"].append(approx_kl)
+                    stats["clip_fraction"].append(clip_fraction)
+                    epoch_kl.append(approx_kl)
+
+            # Stop the actor epochs (the critic keeps fitting) if the policy has moved too far from the old one
+            if update_actor and self.target_kl is not None and np.mean(epoch_kl) > self.target_kl:
+                update_actor = False
 
         return stats
 
     def record_experience(self, experience: Experience) -> None:
-        self._episodic_buffer.append(experience)
+        # Reuse the log-likelihood (and value) computed with the action, unless the action comes from elsewhere
+        if self._last_action is not None and self._last_action[0] is experience.action:
+            _, logp, value = self._last_action
+        else:
+            value = None
+            with torch.no_grad():
+                state = torch.as_tensor(
+                    data=experience.state.reshape((1,) + experience.state.shape),
+                    dtype=torch.float64,
+                    device=self.device
+                )
+                action = torch.as_tensor(
+                    data=np.reshape(experience.action, (1, -1)),
+                    dtype=torch.float64,
+                    device=self.device
+                )
+                logp = self._compute_actions_log_likelihood(state, action).reshape(())
+        self._rollout_storage.append(experience, logp, value)
 
-    def compute_action(self, state: np.ndarray, **kwargs) -> np.ndarray:
+    def _critic_step(self, states, g):
+        # Forward pass by critic
+        v = self.critic(states)
+        critic_loss = self._critic_loss(v, g)
+
+        # Backward pass by critic
+        self._critic_optimizer.zero_grad()
+        critic_loss.backward()
+        torch.nn.utils.clip_grad_norm_(self.critic.parameters(), max_norm=self.gradient_max_norm)
+        self._critic_optimizer.step()
+
+        return critic_loss.item()
+
+    def _actor_step(self, states, actions, psi, logp_old):
+        # Forward pass by actor
+        mean, var = self.actor(states)
+        actor_loss, approx_kl, clip_fraction = self._actor_loss(mean, var, actions, psi, logp_old)
+
+        # Backward pass by actor
+        self._actor_optimizer.zero_grad()
+        actor_loss.backward()
+        torch.nn.utils.clip_grad_norm_(self.actor.parameters(), max_norm=self.gradient_max_norm)
+        self._actor_optimizer.step()
+        if self.inference == "frozen":
+            self._inference_actor = None
+
+        return actor_loss.item(), approx_kl, clip_fraction
+
+    def _actor_critic_step(self, states, actions, g, psi, logp_old, update_actor):
+        # Forward pass by shared network (once for both heads)
+        mean, var, v = self.actor.forward_with_value(states)
+        critic_loss = self._critic_loss(v, g)
+        loss = self.value_loss_coefficient * critic_loss
+        if update_actor:
+            actor_loss, approx_kl, clip_fraction = self._actor_loss(mean, var, actions, psi, logp_old)
+            loss = loss + actor_loss
+
+        # Backward pass by shared network
+        self._actor_critic_optimizer.zero_grad()
+        loss.backward()
+        torch.nn.utils.clip_grad_norm_(self.actor.parameters(), max_norm=self.gradient_max_norm)
+        self._actor_critic_optimizer.step()
+        if self.inference == "frozen":
+            self._inference_actor = None
+
+        actor_stats = (actor_loss.item(), approx_kl, clip_fraction) if update_actor else None
+        return critic_loss.item(), actor_stats
+
+    def _critic_loss(self, v, g):
+        n = len(g)
+        assert v.shape == (n, 1)
+        v = v.reshape(-1)
+        critic_loss = torch.nn.functional.mse_loss(g, v)
+        return critic_loss
+
+    def _actor_loss(self, mean, var, actions, psi, logp_old):
+        n = len(actions)
+        logp = normal_log_pdf(actions, mean, var).sum(dim=1)    # assumption: independent action dimensions
+        r = torch.exp(logp - logp_old)
+        assert r.shape == (n,)
+        r_clipped = r.clip(min=1-self.epsilon, max=1 + self.epsilon)
+        assert r_clipped.shape == (n,)
+        actor_loss = - torch.minimum(r * psi, r_clipped * psi).mean()
+
+        # Approximate KL divergence from the old policy (non-negative, low-variance estimator) and fraction of clipped
+        # ratios, both measured before the step
         with torch.no_grad():
-            state = torch.as_tensor(
-                data=state.reshape((1,) + state.shape),
-                dtype=torch.float64,
-                device=self.device
-            )
-            mean, var = self.actor(state)
-            mean, var = mean.reshape(-1), var.reshape(-1)
-            action = torch.normal(mean, torch.sqrt(var))
-            action = action.numpy()
+            approx_kl = ((r - 1) - torch.log(r)).mean()
+            clip_fraction = ((r - 1).abs() > self.epsilon).to(torch.float64).mean()
+
+        return actor_loss, approx_kl.item(), clip_fraction.item()
+
+    def compute_action(self, state: np.ndarray, **kwargs) -> np.ndarray:
+        state = torch.as_tensor(
+            data=state.reshape((1,) + state.shape),
+            dtype=torch.float64,
+            device=self.device
+        )
+        # With a shared network, the value of the state comes for free
+        actions, log_probs, values = self._sample_actions(state, return_value=self.shared_network)
+        action = actions[0].cpu().numpy()
+        value = values[0] if values is not None else None
+        self._last_action = (action, log_probs[0], value)
         return action
 
-    def _compute_actions_likelihood(self, states, actions):
+    def compute_actions(
+            self,
+            states: np.ndarray,
+            deterministic: bool = False,
+            return_log_prob: bool = False,
+            return_value: bool = False
+    ) -> np.ndarray | tuple[np.ndarray, ...]:
+        """Calculates the actions for a batch of states with a single forward pass (e.g., for vectorized environments).
+
+        :param states: states, with shape (n, state_dim)
+        :type states: np.ndarray
+        :param deterministic: if True, the actions are the means of the policy instead of samples
+        :type deterministic: bool, optional
+        :param return_log_prob: if True, the log-likelihoods of the actions are returned as well
+        :type return_log_prob: bool, optional
+        :param return_value: if True, the values of the states are returned as well
+        :type return_value: bool, optional
+        :return: actions, with shape (n, action_dim), followed by the log-likelihoods and the values, with shape (n,),
+            if requested
+        :rtype: np.ndarray or tuple[np.ndarray, ...]
+        """
+        states = torch.as_tensor(states, dtype=torch.float64, device=self.device)
+        actions, log_probs, values = self._sample_actions(states, deterministic=deterministic, return_value=return_value)
+        outputs = [actions]
+        if return_log_prob:
+            outputs.append(log_probs)
+        if return_value:
+            outputs.append(values)
+        outputs = [output.cpu().numpy() for output in outputs]
+        return outputs[0] if len(outputs) == 1 else tuple(outputs)
+
+    def seed(self, seed: int | None) -> None:
+        super().seed(seed)
+        self._generator_seed = seed
+        self._generator = None      # created at the first use, on the device of the agent
+
+    def state_dict(self) -> dict:
+        state = super().state_dict()
+        state["actor"] = self.actor.state_dict()
+        if self.shared_network:
+            state["actor_critic_optimizer"] = self._actor_critic_optimizer.state_dict()
+        else:
+            state["critic"] = self.critic.state_dict()
+            state["critic_optimizer"] = self._critic_optimizer.state_dict()
+            state["actor_optimizer"] = self._actor_optimizer.state_dict()
+        state["rollout_storage"] = self._rollout_storage.state_dict()
+        state["last_action"] = self._last_action
+        return state
+
+    def load_state_dict(self, state: dict) -> None:
+        super().load_state_dict(state)
+        self.actor.load_state_dict(state["actor"])
+        if self.shared_network:
+            self._actor_critic_optimizer.load_state_dict(state["actor_critic_optimizer"])
+        else:
+            self.critic.load_state_dict(state["critic"])
+            self._critic_optimizer.load_state_dict(state["critic_optimizer"])
+            self._actor_optimizer.load_state_dict(state["actor_optimizer"])
+        self._rollout_storage.load_state_dict(state["rollout_storage"])
+        self._last_action = state["last_action"]
+        self._inference_actor = None
+
+    def _get_rng_state(self) -> dict:
+        state = super()._get_rng_state()
+        state["generator"] = self._generator.get_state() if self._generator is not None else None
+        state["generator_seed"] = self._generator_seed
+        return state
+
+    def _set_rng_state(self, state: dict) -> None:
+        super()._set_rng_state(state)
+        self._generator_seed = state.get("generator_seed", self._generator_seed)
+        if state["generator"] is not None:
+            self._get_generator().set_state(state["generator"])
+        else:
+            self._generator = None
+
+    def __getstate__(self) -> dict:
+        # generators cannot be pickled, so their state is stored instead
+        # compiled modules cannot be pickled either, they are compiled again at the first use
+        state = self.__dict__.copy()
+        if self._generator is not None:
+            state["_generator"] = self._generator.get_state()
+        state["_inference_actor"] = None
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        generator_state = state["_generator"]
+        self.__dict__.update(state)
+        if generator_state is not None:
+            self._generator = torch.Generator(device=self.device)
+            self._generator.set_state(generator_state)
+
+    def _sample_actions(self, states, deterministic=False, return_value=False):
+        n = len(states)
+        actor = self._get_inference_actor()
+        with torch.inference_mode():
+            if self.shared_network and return_value:
+                mean, var, values = actor.forward_with_value(states)
+            else:
+                mean, var = actor(states)
+                values = self.critic(states) if return_value else None
+            assert mean.shape == (n, self._action_dim) and var.shape == (n, self._action_dim)
+
+            # Reparameterised sampling: mean + standard deviation * standard normal noise
+            if deterministic:
+                actions = mean
+            else:
+                noise = torch.randn(mean.shape, generator=self._get_generator(), dtype=mean.dtype, device=mean.device)
+                actions = mean + torch.sqrt(var) * noise
+            log_probs = normal_log_pdf(actions, mean, var).sum(dim=1)   # assumption: independent action dimensions
+
+            if values is not None:
+                assert values.shape == (n, 1)
+                values = values.reshape(-1)
+        return actions, log_probs, values
+
+    def _get_inference_actor(self):
+        if self._inference_actor is None:
+            example_input = torch.zeros((1, self._state_dim), dtype=torch.float64, device=self.device)
+            methods = ("forward", "forward_with_value") if self.shared_network else ("forward",)
+            self._inference_actor = compile_for_inference(self.actor, example_input, self.inference, methods)
+        return self._inference_actor
+
+    def _get_generator(self):
+        if self._generator is None:
+            self._generator = torch.Generator(device=self.device)
+            if self._generator_seed is not None:
+                self._generator.manual_seed(self._generator_seed)
+            else:
+                self._generator.seed()
+        return self._generator
+
+    def _compute_actions_log_likelihood(self, states, actions):
         assert len(states) == len(actions)
         n = len(states)
         mean, var = self.actor(states)
-        pi = normal_pdf(actions, mean, var).prod(dim=1)     # assumption: independent action dimensions
-        assert mean.shape == (n, self._action_dim) and var.shape == (n, self._action_dim) and pi.shape == (n,)
-        return pi
+        logp = normal_log_pdf(actions, mean, var).sum(dim=1)    # assumption: independent action dimensions
+        assert mean.shape == (n, self._action_dim) and var.shape == (n, self._action_dim) and logp.shape == (n,)
+        return logp
 
 
 class PPOCritic(MultiLayerPerceptron):
@@ -250,3 +599,68 @@ class PPOActor(torch.nn.Module):
         mean = self._mean_head(x)
         var = self._var_head(x)
         return mean, var
+
+
+class PPOActorCritic(PPOActor):
+    """PPOActor with an additional value head on top of the shared hidden layers."""
+
+    def __init__(
+            self,
+            *,
+            state_dim: int,
+            action_dim: int,
+            shared_hidden_layer_sizes: list[int],
+            mean_hidden_layer_sizes: list[int],
+            var_hidden_layer_sizes: list[int],
+            value_hidden_layer_sizes: list[int],
+            hidden_layer_activation: str,
+            value_hidden_layer_activation: str
+    ):
+        super().__init__(
+            state_dim=state_dim,
+            action_dim=action_dim,
+            shared_hidden_layer_sizes=shared_hidden_layer_sizes,
+            mean_hidden_layer_sizes=mean_hidden_layer_sizes,
+            var_hidden_layer_sizes=var_hidden_layer_sizes,
+            hidden_layer_activation=hidden_layer_activation
+        )
+        self.value_hidden_layer_sizes = value_hidden_layer_sizes
+        self.value_hidden_layer_activation = value_hidden_layer_activation
+
+        self._value_head = MultiLayerPerceptron(
+            input_size=self.shared_hidden_layer_sizes[-1],
+            hidden_layer_sizes=self.value_hidden_layer_sizes,
+            hidden_layer_activation=self.value_hidden_layer_activation,
+            output_size=1,
+            include_top=True
+        )
+
+    def value(self, x):
+        x = x.to(torch.float64)
+        x = self._shared_layers(x)
+        return self._value_head(x)
+
+    def forward_with_value(self, x):
+        x = x.to(torch.float64)
+        x = self._shared_layers(x)
+        mean = self._mean_head(x)
+        var = self._var_head(x)
+        value = self._value_head(x)
+        return mean, var, value
+
+    def policy_parameters(self):
+        return [p for name, p in self.named_parameters() if not name.startswith("_value_head.")]
+
+    def value_parameters(self):
+        return list(self._value_head.parameters())
+
+
+class PPOValueView(torch.nn.Module):
+    """Critic interface (state -> value) to the value head of a PPOActorCritic."""
+
+    def __init__(self, actor_critic: PPOActorCritic):
+        super().__init__()
+        self.actor_critic = actor_critic
+
+    def forward(self, x):
+        return self.actor_critic.value(x)
@@ -0,0 +1,138 @@
+import cProfile
+import time
+from collections import defaultdict
+from pathlib import Path
+from el2805.agents.rl.metric_recorder import MetricRecorder
+
+
+class Profiler:
+    """Opt-in instrumentation of the training loop. It accumulates the time spent in each phase (environment step,
+    action computation, experience recording, update, and the phases of the agent's update) with perf_counter_ns, and
+    records per-episode stats: time per phase (episode_time_<phase>, in seconds), steps per second and updates per
+    second. Optionally, it captures a cProfile or torch.profiler trace over a window of episodes.
+
+    The training loop and the agents check whether a profiler is set before timing a phase, so training without
+    profiler has no overhead.
+    """
+
+    def __init__(
+            self,
+            *,
+            capture: str | None = None,
+            capture_episodes: tuple[int, int] | None = None,
+            capture_filepath: str | Path | None = None
+    ):
+        """Initializes a Profiler.
+
+        :param capture: profiler run over the capture window, "cprofile" or "torch", if None nothing is captured
+        :type capture: str, optional
+        :param capture_episodes: first and last episode of the capture window (both included)
+        :type capture_episodes: tuple[int, int], optional
+        :param capture_filepath: path where to save the capture (cProfile stats or Chrome trace)
+        :type capture_filepath: str or Path, optional
+        """
+        assert capture is None or (capture_episodes is not None and capture_filepath is not None)
+        if capture not in (None, "cprofile", "torch"):
+            raise NotImplementedError
+        self.capture = capture
+        self.capture_episodes = capture_episodes
+        self.capture_filepath = Path(capture_filepath) if capture_filepath is not None else None
+
+        self.times = defaultdict(int)       # total time per phase (ns)
+        self.counts = defaultdict(int)      # total number of calls per phase
+        self._episode_times = defaultdict(int)
+        self._episode_start = None
+        self._episode_steps = 0
+        self._episode_updates = 0
+        self._capture_profiler = None
+
+    @staticmethod
+    def tic() -> int:
+        """Returns the current time, to be passed to toc() at the end of a phase.
+
+        :return: current time (ns)
+        :rtype: int
+        """
+        return time.perf_counter_ns()
+
+    def toc(self, phase: str, start: int) -> int:
+        """Accumulates the time elapsed since start in the specified phase.
+
+        :param phase: name of the phase
+        :type phase: str
+        :param start: start time of the phase, as returned by tic() or by the previous toc()
+        :type start: int
+        :return: current time (ns), so that consecutive phases can be chained
+        :rtype: int
+        """
+        now = time.perf_counter_ns()
+        self._episode_times[phase] += now - start
+        self.counts[phase] += 1
+        return now
+
+    def start_episode(self, episode: int) -> None:
+        """Marks the start of an episode.
+
+        :param episode: episode number (starting from 1)
+        :type episode: int
+        """
+        if self.capture is not None and episode == self.capture_episodes[0]:
+            self._start_capture()
+        self._episode_times.clear()
+        self._episode_steps = 0
+        self._episode_updates = 0
+        self._episode_start = time.perf_counter_ns()
+
+    def count(self, steps: int = 0, updates: int = 0) -> None:
+        """Counts environment steps and updates of the current episode.
+
+        :param steps: number of environment steps
+        :type steps: int, optional
+        :param updates: number of updates
+        :type updates: int, optional
+        """
+        self._episode_steps += steps
+        self._episode_updates += updates
+
+    def end_episode(self, episode: int, stats: MetricRecorder) -> None:
+        """Marks the end of an episode and records its stats.
+
+        :param episode: episode number (starting from 1)
+        :type episode: int
+        :param stats: recorder where to store the stats
+        :type stats: MetricRecorder
+        """
+        duration = (time.perf_counter_ns() - self._episode_start) / 1e9
+        for phase, phase_time in self._episode_times.items():
+            stats.append(f"episode_time_{phase}", phase_time / 1e9)
+            self.times[phase] += phase_time
+        stats.append("episode_steps_per_second", self._episode_steps / duration)
+        stats.append("episode_updates_per_second", self._episode_updates / duration)
+
+        if self._capture_profiler is not None and episode == self.capture_episodes[1]:
+            self.stop_capture()
+
+    def stop_capture(self) -> None:
+        """Stops the capture, if running, and saves it. Called automatically at the end of the capture window."""
+        if self._capture_profiler is None:
+            return
+        self.capture_filepath.parent.mkdir(parents=True, exist_ok=True)
+        if self.capture == "cprofile":
+            self._capture_profiler.disable()
+            self._capture_profiler.dump_stats(self.capture_filepath)
+        else:
+            self._capture_profiler.stop()
+            self._capture_profiler.export_chrome_trace(str(self.capture_filepath))
+        self._capture_profiler = None
+
+    def _start_capture(self) -> None:
+        if self.capture == "cprofile":
+            self._capture_profiler = cProfile.Profile()
+            self._capture_profiler.enable()
+        else:
+            import torch.profiler
+            activities = [torch.profiler.ProfilerActivity.CPU]
+            if torch.cuda.is_available():
+                activities.append(torch.profiler.ProfilerActivity.CUDA)
+            self._capture_profiler = torch.profiler.profile(activities=activities)
+            self._capture_profiler.start()
@@ -10,6 +10,8 @@ from el2805.utils import decide_random
 class QAgent(RLAgent, ABC):
     """Interface for a RL algorithm learning the Q-function with discrete state and action spaces."""
 
+    environment: TabularRLProblem   # the agent's own (seeded) copy, set by Agent.__init__
+
     def __init__(
             self,
             *,
@@ -51,7 +53,6 @@ class QAgent(RLAgent, ABC):
         :type seed: int, optional
         """
         super().__init__(environment=environment, seed=seed)
-        self.environment = environment  # to avoid warnings of type hints
         self.discount = discount
         self.learning_rate = learning_rate
         self.epsilon = epsilon
@@ -107,6 +108,19 @@ class QAgent(RLAgent, ABC):
         v = max(self._q[s])
         return v
 
+    def state_dict(self) -> dict:
+        # Tables flattened into single arrays (the number of valid actions of each state is known from the environment)
+        state = super().state_dict()
+        state["q"] = np.concatenate(self._q)
+        state["n"] = np.concatenate(self._n)
+        return state
+
+    def load_state_dict(self, state: dict) -> None:
+        super().load_state_dict(state)
+        splits = np.cumsum([len(q) for q in self._q])[:-1]
+        self._q = np.split(np.array(state["q"]), splits)
+        self._n = np.split(np.array(state["n"]), splits)
+
     def compute_action(
             self,
             state: Any,
@@ -0,0 +1,378 @@
+import queue
+import threading
+import torch
+import weakref
+from collections import deque
+import torch.multiprocessing as mp
+from el2805.agents.rl.utils import Experience
+
+_BUFFER_TENSOR_NAMES = ("states", "actions", "rewards", "next_states", "dones")
+
+
+class ReplayBuffer:
+    """Experience replay buffer for discrete actions, stored as a circular buffer of preallocated tensors."""
+
+    def __init__(self, *, capacity: int, state_dim: int):
+        """Initializes a ReplayBuffer.
+
+        :param capacity: maximum number of experiences, the oldest experiences are overwritten when it is full
+        :type capacity: int
+        :param state_dim: dimension of the state space
+        :type state_dim: int
+        """
+        self.capacity = capacity
+        self.state_dim = state_dim
+
+        self._states = torch.zeros((capacity, state_dim), dtype=torch.float64)
+        self._actions = torch.zeros(capacity, dtype=torch.long)
+        self._rewards = torch.zeros(capacity, dtype=torch.float64)
+        self._next_states = torch.zeros((capacity, state_dim), dtype=torch.float64)
+        self._dones = torch.zeros(capacity, dtype=torch.bool)
+        self._counters = torch.zeros(2, dtype=torch.long)     # (next write position, number of experiences)
+        self._lock = None
+
+    def __len__(self) -> int:
+        return int(self._counters[1])
+
+    @property
+    def shared(self) -> bool:
+        return self._lock is not None
+
+    def share_memory_(self, context=None) -> "ReplayBuffer":
+        """Moves the buffer to shared memory, so that it can be written and sampled by several processes. Reads and
+        writes are then protected by a lock.
+
+        :param context: multiprocessing context of the processes sharing the buffer (default context if None)
+        :type context: multiprocessing.context.BaseContext, optional
+        :return: the buffer itself
+        :rtype: ReplayBuffer
+        """
+        if not self.shared:
+            for tensor in self._tensors() + (self._counters,):
+                tensor.share_memory_()
+            self._lock = (context if context is not None else mp).Lock()
+        return self
+
+    def append(self, experience: Experience) -> None:
+        """Stores a new experience, overwriting the oldest one if the buffer is full.
+
+        :param experience: new experience to store
+        :type experience: Experience
+        """
+        if self._lock is not None:
+            with self._lock:
+                self._append(experience)
+        else:
+            self._append(experience)
+
+    def sample(
+            self,
+            rng,
+            batch_size: int,
+            cer: bool = False,
+            n_batches: int | None = None
+    ) -> tuple[torch.Tensor, ...]:
+        """Samples mini-batches of experiences uniformly at random (with replacement).
+
+        :param rng: random number generator used to sample the experiences
+        :type rng: np.random.RandomState
+        :param batch_size: number of experiences per mini-batch
+        :type batch_size: int
+        :param cer: enables CER (combined experience replay), i.e., the last experience is always included
+        :type cer: bool, optional
+        :param n_batches: number of mini-batches sampled at once, if None a single mini-batch without the batch axis
+        :type n_batches: int, optional
+        :return: (states, actions, rewards, next_states, dones), with shape (n_batches, batch_size, ...) or
+            (batch_size, ...) if n_batches is None
+        :rtype: tuple[torch.Tensor, ...]
+        """
+        indices = self.sample_indices(rng, batch_size, cer=cer, n_batches=n_batches)
+        return self.gather(indices)
+
+    def sample_indices(
+            self,
+            rng,
+            batch_size: int,
+            cer: bool = False,
+            n_batches: int | None = None
+    ) -> torch.Tensor:
+        """Samples the positions of mini-batches of experiences uniformly at random (with replacement). See sample().
+
+        :param rng: random number generator used to sample the experiences
+        :type rng: np.random.RandomState
+        :param batch_size: number of experiences per mini-batch
+        :type batch_size: int
+        :param cer: enables CER (combined experience replay), i.e., the last experience is always included
+        :type cer: bool, optional
+        :param n_batches: number of mini-batches sampled at once, if None a single mini-batch without the batch axis
+        :type n_batches: int, optional
+        :return: positions of the experiences, to be passed to gather()
+        :rtype: torch.Tensor
+        """
+        shape = (batch_size,) if n_batches is None else (n_batches, batch_size)
+        indices = torch.as_tensor(rng.choice(len(self), size=shape))
+        if cer:
+            indices[..., -1] = len(self) - 1
+        return indices
+
+    def gather(self, indices: torch.Tensor) -> tuple[torch.Tensor, ...]:
+        """Returns the experiences at the specified positions, where 0 is the oldest experience in the buffer.
+
+        :param indices: positions of the experiences (any shape)
+        :type indices: torch.Tensor
+        :return: (states, actions, rewards, next_states, dones)
+        :rtype: tuple[torch.Tensor, ...]
+        """
+        if self._lock is not None:
+            with self._lock:
+                return self._gather(indices)
+        else:
+            return self._gather(indices)
+
+    def state_dict(self) -> dict:
+        """Returns the stored experiences and the write position.
+
+        :return: state of the buffer
+        :rtype: dict
+        """
+        position, size = self._counters.tolist()
+        # copies, otherwise torch.save() would write the whole preallocated storage of the views
+        state = {name: tensor[:size].clone() for name, tensor in zip(_BUFFER_TENSOR_NAMES, self._tensors())}
+        state["position"] = position
+        return state
+
+    def load_state_dict(self, state: dict) -> None:
+        """Replaces the stored experiences with the ones of a state returned by state_dict().
+
+        :param state: state of a buffer with the same capacity
+        :type state: dict
+        """
+        size = len(state["states"])
+        assert size <= self.capacity
+        for name, tensor in zip(_BUFFER_TENSOR_NAMES, self._tensors()):
+            tensor[:size] = torch.as_tensor(state[name])
+        self._counters[0] = state["position"]
+        self._counters[1] = size
+
+    def _append(self, experience: Experience) -> None:
+        position, size = self._counters.tolist()
+        self._states[position] = torch.as_tensor(experience.state, dtype=torch.float64)
+        self._actions[position] = int(experience.action)
+        self._rewards[position] = float(experience.reward)
+        self._next_states[position] = torch.as_tensor(experience.next_state, dtype=torch.float64)
+        self._dones[position] = bool(experience.done)
+        self._counters[0] = (position + 1) % self.capacity
+        self._counters[1] = min(size + 1, self.capacity)
+
+    def _gather(self, indices: torch.Tensor) -> tuple[torch.Tensor, ...]:
+        # Positions are relative to the oldest experience, which is at the write position once the buffer is full
+        position, size = self._counters.tolist()
+        start = position if size == self.capacity else 0
+        indices = (indices + start) % self.capacity
+        return tuple(tensor[indices] for tensor in self._tensors())
+
+    def _tensors(self) -> tuple[torch.Tensor, ...]:
+        return self._states, self._actions, self._rewards, self._next_states, self._dones
+
+
+class NStepAccumulator:
+    """Turns a stream of 1-step experiences into n-step experiences, whose reward is the discounted sum of the next n
+    rewards and whose next state is the state reached after n steps. The experiences are truncated at the end of the
+    episode, in which case they are terminal (no bootstrap) and the discount of the target is irrelevant."""
+
+    def __init__(self, *, n_steps: int, discount: float):
+        """Initializes a NStepAccumulator.
+
+        :param n_steps: number of steps of the returns
+        :type n_steps: int
+        :param discount: discount factor of the MDP
+        :type discount: float
+        """
+        assert n_steps > 0
+        self.n_steps = n_steps
+        self.discount = discount
+        self._pending = deque()
+
+    def append(self, experience: Experience) -> list[Experience]:
+        """Adds a new 1-step experience and returns the n-step experiences that are complete.
+
+        :param experience: new 1-step experience
+        :type experience: Experience
+        :return: complete n-step experiences (all the pending ones at the end of the episode)
+        :rtype: list[Experience]
+        """
+        self._pending.append(experience)
+        completed = []
+        if experience.done:
+            while len(self._pending) > 0:
+                completed.append(self._pop())
+        elif len(self._pending) == self.n_steps:
+            completed.append(self._pop())
+        return completed
+
+    def state_dict(self) -> dict:
+        """Returns the pending 1-step experiences.
+
+        :return: state of the accumulator
+        :rtype: dict
+        """
+        return {"pending": list(self._pending)}
+
+    def load_state_dict(self, state: dict) -> None:
+        """Replaces the pending 1-step experiences with the ones of a state returned by state_dict().
+
+        :param state: state of the accumulator
+        :type state: dict
+        """
+        self._pending = deque(state["pending"])
+
+    def _pop(self) -> Experience:
+        first, last = self._pending[0], self._pending[-1]
+        reward = sum(self.discount ** i * e.reward for i, e in enumerate(self._pending))
+        self._pending.popleft()
+        return Experience(
+            episode=first.episode,
+            state=first.state,
+            action=first.action,
+            reward=reward,
+            next_state=last.next_state,
+            done=last.done
+        )
+
+
+class MinibatchPrefetcher:
+    """Prepares mini-batches in a background thread, so that gathering the experiences and moving them to the device
+    overlap with the forward and backward passes of the current mini-batch.
+
+    The positions of the experiences are sampled by the calling thread, and the experiences are gathered before the
+    buffer changes again (see synchronize()). Hence, the mini-batches are deterministic under a fixed seed, but they
+    are sampled n_prefetch updates in advance.
+
+    The thread is started at the first request and holds only a weak reference to the prefetcher, so that it stops
+    when the prefetcher is garbage-collected (together with its replay buffer) even if close() is never called.
+    """
+
+    def __init__(self, *, replay_buffer: ReplayBuffer, device: str, n_prefetch: int):
+        """Initializes a MinibatchPrefetcher.
+
+        :param replay_buffer: replay buffer from which the mini-batches are gathered
+        :type replay_buffer: ReplayBuffer
+        :param device: device where to move the mini-batches (e.g., "cpu")
+        :type device: str
+        :param n_prefetch: number of mini-batches prepared in advance
+        :type n_prefetch: int
+        """
+        assert n_prefetch > 0
+        self.replay_buffer = replay_buffer
+        self.device = device
+        self.n_prefetch = n_prefetch
+        self._reset([])
+
+    def __len__(self) -> int:
+        """Returns the number of mini-batches requested and not retrieved yet.
+
+        :return: number of pending mini-batches
+        :rtype: int
+        """
+        return self._n_pending
+
+    def put(self, indices: torch.Tensor) -> None:
+        """Requests a new mini-batch.
+
+        :param indices: positions of the experiences in the replay buffer (see ReplayBuffer.sample_indices())
+        :type indices: torch.Tensor
+        """
+        if self._thread is None:
+            self._thread = threading.Thread(
+                target=_run_prefetcher,
+                args=(weakref.ref(self), self._requests, self._minibatches),
+                daemon=True
+            )
+            self._thread.start()
+            self._finalizer = weakref.finalize(self, self._requests.put, None)
+        self._n_pending += 1
+        self._requests.put(indices)
+
+    def get(self) -> tuple[torch.Tensor, ...]:
+        """Returns the oldest mini-batch requested, waiting for it if necessary.
+
+        :return: (states, actions, rewards, next_states, dones)
+        :rtype: tuple[torch.Tensor, ...]
+        """
+        assert self._n_pending > 0
+        self._n_pending -= 1
+        return self._minibatches.get()
+
+    def synchronize(self) -> None:
+        """Waits until all the mini-batches requested have been gathered. Must be called before modifying the buffer."""
+        self._requests.join()
+
+    def close(self) -> None:
+        """Stops the background thread, which is started again at the next request."""
+        if self._thread is not None:
+            self._finalizer.detach()
+            self._requests.put(None)
+            self._thread.join()
+            self._thread = None
+
+    def state_dict(self) -> dict:
+        """Returns the mini-batches requested and not retrieved yet, waiting for them to be gathered.
+
+        :return: state of the prefetcher
+        :rtype: dict
+        """
+        self.synchronize()
+        minibatches = [self._minibatches.get() for _ in range(self._n_pending)]
+        for minibatch in minibatches:
+            self._minibatches.put(minibatch)
+        return {"minibatches": minibatches}
+
+    def load_state_dict(self, state: dict) -> None:
+        """Replaces the pending mini-batches with the ones of a state returned by state_dict().
+
+        :param state: state of the prefetcher
+        :type state: dict
+        """
+        self.synchronize()
+        for _ in range(self._n_pending):
+            self._minibatches.get()
+        for minibatch in state["minibatches"]:
+            self._minibatches.put(tuple(tensor.to(self.device) for tensor in minibatch))
+        self._n_pending = len(state["minibatches"])
+
+    def __getstate__(self) -> dict:
+        # threads and queues cannot be pickled, so the pending mini-batches are stored as a list
+        return {
+            "replay_buffer": self.replay_buffer,
+            "device": self.device,
+            "n_prefetch": self.n_prefetch,
+            "minibatches": self.state_dict()["minibatches"]
+        }
+
+    def __setstate__(self, state: dict) -> None:
+        self.replay_buffer = state["replay_buffer"]
+        self.device = state["device"]
+        self.n_prefetch = state["n_prefetch"]
+        self._reset(state["minibatches"])
+
+    def _reset(self, minibatches: list[tuple[torch.Tensor, ...]]) -> None:
+        self._requests = queue.Queue()
+        self._minibatches = queue.Queue(maxsize=self.n_prefetch + 1)
+        for minibatch in minibatches:
+            self._minibatches.put(minibatch)
+        self._n_pending = len(minibatches)
+        self._thread = None     # started at the first request
+        self._finalizer = None
+
+
+def _run_prefetcher(prefetcher_ref: weakref.ref, requests: queue.Queue, minibatches: queue.Queue) -> None:
+    # The prefetcher is referenced only while gathering a mini-batch, so that it can be garbage-collected meanwhile
+    while (indices := requests.get()) is not None:
+        prefetcher = prefetcher_ref()
+        if prefetcher is None:
+            break
+        minibatch = prefetcher.replay_buffer.gather(indices)
+        minibatch = tuple(tensor.to(prefetcher.device, non_blocking=True) for tensor in minibatch)
+        del prefetcher
+        minibatches.put(minibatch)
+        requests.task_done()
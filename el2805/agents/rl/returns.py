@@ -0,0 +1,121 @@
+import torch
+
+
+def discounted_cumsum(
+        x: torch.Tensor,
+        discount: float,
+        dones: torch.Tensor | None = None,
+        bootstrap: float | torch.Tensor = 0,
+        block_size: int = 256
+) -> torch.Tensor:
+    """Calculates the reverse discounted cumulative sum y_t = x_t + discount * (1 - done_t) * y_{t+1}, with
+    y_n = bootstrap, over a sequence that can contain several episodes.
+
+    The sequence is processed in blocks from the end. Within each block, the sums are computed at once by multiplying
+    by a matrix of discount powers, masked so that the sums do not cross the end of an episode. Hence, there are only
+    n / block_size Python iterations, and the discount powers never exceed block_size (no overflow for any discount).
+
+    :param x: sequence to sum, with shape (n,)
+    :type x: torch.Tensor
+    :param discount: discount factor
+    :type discount: float
+    :param dones: whether each step is the last of an episode, with shape (n,), if None the sequence is one episode
+    :type dones: torch.Tensor, optional
+    :param bootstrap: value after the last step (e.g., value of the last next state of a truncated rollout)
+    :type bootstrap: float or torch.Tensor, optional
+    :param block_size: number of steps processed at once
+    :type block_size: int, optional
+    :return: discounted cumulative sums, with shape (n,)
+    :rtype: torch.Tensor
+    """
+    n = len(x)
+    if dones is None:
+        dones = torch.zeros(n, dtype=torch.bool, device=x.device)
+    assert x.shape == (n,) and dones.shape == (n,)
+
+    # Discount powers: discount^(j-i) for j >= i, 0 otherwise
+    exponents = torch.arange(block_size, dtype=x.dtype, device=x.device)
+    exponents = exponents.reshape(1, -1) - exponents.reshape(-1, 1)
+    powers = torch.where(exponents >= 0, discount ** exponents.clamp(min=0), torch.zeros_like(exponents))
+
+    y = torch.empty_like(x)
+    carry = torch.as_tensor(bootstrap, dtype=x.dtype, device=x.device)
+    for end in range(n, 0, -block_size):
+        start = max(end - block_size, 0)
+        m = end - start
+        x_block, dones_block = x[start:end], dones[start:end].to(torch.long)
+
+        # Episode of each step within the block (number of episode ends before it)
+        episodes = dones_block.cumsum(dim=0) - dones_block
+        same_episode = episodes.reshape(-1, 1) == episodes.reshape(1, -1)
+
+        # Sums within the block, plus carry from the next block for the steps of the last (unfinished) episode
+        y_block = (powers[:m, :m] * same_episode) @ x_block
+        unfinished = episodes == episodes[-1] + dones_block[-1]
+        y_block = y_block + discount ** (m - exponents[0, :m]) * carry * unfinished
+
+        y[start:end] = y_block
+        carry = y_block[0]
+
+    return y
+
+
+def discounted_returns(
+        rewards: torch.Tensor,
+        discount: float,
+        dones: torch.Tensor | None = None,
+        last_value: float | torch.Tensor = 0
+) -> torch.Tensor:
+    """Calculates the discounted returns (Monte Carlo targets) of a sequence that can contain several episodes.
+
+    :param rewards: rewards, with shape (n,)
+    :type rewards: torch.Tensor
+    :param discount: discount factor of the MDP
+    :type discount: float
+    :param dones: whether each step is the last of an episode, with shape (n,), if None the sequence is one episode
+    :type dones: torch.Tensor, optional
+    :param last_value: value estimate used to bootstrap the return of the last step, if its episode is not over
+    :type last_value: float or torch.Tensor, optional
+    :return: discounted returns, with shape (n,)
+    :rtype: torch.Tensor
+    """
+    return discounted_cumsum(rewards, discount, dones=dones, bootstrap=last_value)
+
+
+def generalized_advantage_estimation(
+        rewards: torch.Tensor,
+        values: torch.Tensor,
+        discount: float,
+        gae_lambda: float,
+        dones: torch.Tensor | None = None,
+        last_value: float | torch.Tensor = 0
+) -> tuple[torch.Tensor, torch.Tensor]:
+    """Calculates the advantages with GAE (Generalized Advantage Estimation) and the corresponding lambda-returns
+    (targets for the critic) of a sequence that can contain several episodes.
+
+    :param rewards: rewards, with shape (n,)
+    :type rewards: torch.Tensor
+    :param values: value estimates of the states, with shape (n,)
+    :type values: torch.Tensor
+    :param discount: discount factor of the MDP
+    :type discount: float
+    :param gae_lambda: GAE parameter, 0 corresponds to TD(0) advantages and 1 to Monte Carlo advantages
+    :type gae_lambda: float
+    :param dones: whether each step is the last of an episode, with shape (n,), if None the sequence is one episode
+    :type dones: torch.Tensor, optional
+    :param last_value: value estimate of the last next state, used if its episode is not over
+    :type last_value: float or torch.Tensor, optional
+    :return: (advantages, lambda-returns), both with shape (n,)
+    :rtype: tuple[torch.Tensor, torch.Tensor]
+    """
+    n = len(rewards)
+    if dones is None:
+        dones = torch.zeros(n, dtype=torch.bool, device=rewards.device)
+    assert rewards.shape == (n,) and values.shape == (n,) and dones.shape == (n,)
+
+    last_value = torch.as_tensor(last_value, dtype=values.dtype, device=values.device).reshape(1)
+    next_values = torch.cat((values[1:], last_value))
+    deltas = rewards + discount * next_values * dones.logical_not() - values     # TD errors
+    advantages = discounted_cumsum(deltas, discount * gae_lambda, dones=dones)
+    returns = advantages + values
+    return advantages, returns
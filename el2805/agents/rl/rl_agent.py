@@ -1,17 +1,26 @@
 import gym
+import multiprocessing as mp
 import numpy as np
-import torch
+import sys
 from abc import ABC, abstractmethod
-from tqdm import trange
-from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from tqdm import tqdm, trange
 from el2805.agents.agent import Agent
-from el2805.agents.utils import running_average
+from el2805.agents.utils import RunningAverage
+from el2805.agents.rl.callbacks import Callback, get_hook_callbacks
+from el2805.agents.rl.checkpoint import load_checkpoint
+from el2805.agents.rl.metric_recorder import MetricRecorder
+from el2805.agents.rl.profiler import Profiler
 from el2805.agents.rl.utils import Experience
+from el2805.utils import get_make_arguments, make_environment
 
 
 class RLAgent(Agent, ABC):
     """Interface for a RL algorithm."""
 
+    _profiler = None    # profiler of the training in progress, if any (also used by update() to time its phases)
+
     def __init__(self, environment: gym.Env, seed: int | None = None):
         """Initializes a RLAgent.
 
@@ -43,36 +52,118 @@ class RLAgent(Agent, ABC):
         """
         raise NotImplementedError
 
-    def train(self, n_episodes: int, early_stop_reward: float | None = None) -> dict:
+    def train(
+            self,
+            n_episodes: int,
+            early_stop_reward: float | None = None,
+            action_repeat: int = 1,
+            progress_period: int = 1,
+            metrics: MetricRecorder | None = None,
+            profiler: Profiler | None = None,
+            callbacks: list[Callback] | None = None,
+            resume_from: str | Path | None = None
+    ) -> MetricRecorder:
         """Trains the RL agent for the specified number of episodes.
 
         :param n_episodes: number of training episodes
         :type n_episodes: int
         :param early_stop_reward: average reward considered as problem solved
         :type early_stop_reward: float, optional
-        :return: dictionary of training stats (per episode or per time step, depending on the metric)
-        :rtype: dict
+        :param action_repeat: number of environment steps for which each action is repeated (frame skipping)
+        :type action_repeat: int, optional
+        :param progress_period: period for updating the progress bar description, expressed in number of episodes
+        :type progress_period: int, optional
+        :param metrics: recorder where to store the training stats (e.g., to stream them to disk), if None they are
+            kept in memory
+        :type metrics: MetricRecorder, optional
+        :param profiler: profiler timing the phases of training (environment step, action computation, experience
+            recording, update), whose per-episode stats are added to the training stats, if None nothing is timed
+        :type profiler: Profiler, optional
+        :param callbacks: callbacks called during training (e.g., for periodic evaluation or checkpointing)
+        :type callbacks: list[Callback], optional
+        :param resume_from: path of a checkpoint (see Checkpointer) from which to resume training, the agent must have
+            the same configuration as the one that saved it. The training stats then include the ones of the
+            checkpoint, and the training goes on until n_episodes episodes in total.
+        :type resume_from: str or Path, optional
+        :return: training stats (per episode or per time step, depending on the metric)
+        :rtype: MetricRecorder
         """
         stats = self._train_or_test(
             n_episodes=n_episodes,
             train=True,
-            early_stop_reward=early_stop_reward
+            early_stop_reward=early_stop_reward,
+            action_repeat=action_repeat,
+            progress_period=progress_period,
+            metrics=metrics,
+            profiler=profiler,
+            callbacks=callbacks,
+            resume_from=resume_from
         )
         return stats
 
-    def test(self, n_episodes: int, render: bool) -> dict:
+    def test(
+            self,
+            n_episodes: int,
+            render: bool,
+            action_repeat: int = 1,
+            progress_period: int = 1,
+            metrics: MetricRecorder | None = None,
+            seed: int | None = None,
+            n_workers: int = 1
+    ) -> MetricRecorder:
         """Tests the RL agent for the specified number of episodes.
 
+        If a seed is given, or if the episodes run in parallel, each episode is run with its own seed (for the agent
+        and the environment) spawned from a SeedSequence. Then, the per-episode stats do not depend on the number of
+        workers: the parallel test returns exactly the same stats, in the same order, as the serial one.
+
         :param n_episodes: number of test episodes
         :type n_episodes: int
-        :return: dictionary of test stats (per episode or per time step, depending on the metric)
-        :rtype: dict
+        :param render: whether to render the environment
+        :type render: bool
+        :param action_repeat: number of environment steps for which each action is repeated (frame skipping)
+        :type action_repeat: int, optional
+        :param progress_period: period for updating the progress bar description, expressed in number of episodes
+        :type progress_period: int, optional
+        :param metrics: recorder where to store the test stats, if None they are kept in memory
+        :type metrics: MetricRecorder, optional
+        :param seed: seed used to generate the seeds of the episodes
+        :type seed: int, optional
+        :param n_workers: number of worker processes among which the episodes are split, each with its own copy of
+            the agent and of the environment
+        :type n_workers: int, optional
+        :return: test stats (per episode or per time step, depending on the metric)
+        :rtype: MetricRecorder
         """
-        stats = self._train_or_test(
-            n_episodes=n_episodes,
-            train=False,
-            render=render
-        )
+        assert n_workers > 0
+        assert not (render and n_workers > 1)
+        episode_seeds = None
+        if seed is not None or n_workers > 1:
+            episode_seeds = [int(s.generate_state(1)[0]) for s in np.random.SeedSequence(seed).spawn(n_episodes)]
+
+        if n_workers == 1:
+            # The seeds of the episodes must not affect the agent after the test (e.g., if training continues)
+            rng_state = self._get_rng_state() if episode_seeds is not None else None
+            try:
+                stats = self._train_or_test(
+                    n_episodes=n_episodes,
+                    train=False,
+                    render=render,
+                    action_repeat=action_repeat,
+                    progress_period=progress_period,
+                    metrics=metrics,
+                    episode_seeds=episode_seeds
+                )
+            finally:
+                if rng_state is not None:
+                    self._set_rng_state(rng_state)
+        else:
+            stats = self._test_in_parallel(
+                episode_seeds=episode_seeds,
+                n_workers=n_workers,
+                action_repeat=action_repeat,
+                metrics=metrics
+            )
         return stats
 
     def seed(self, seed: int | None) -> None:
@@ -83,81 +174,269 @@ class RLAgent(Agent, ABC):
         """
         self._rng = np.random.RandomState(seed)
         self.environment.seed(seed)
-        if seed is not None:
+        torch = _loaded_torch()
+        if seed is not None and torch is not None:
             torch.manual_seed(seed)
             if torch.cuda.is_available():
                 torch.cuda.manual_seed_all(seed)
 
+    def state_dict(self) -> dict:
+        """Returns the training state of the agent, which includes everything that changes during training (e.g.,
+        parameters, optimizer state, stored experiences) and the RNG states of the agent and the environment. Together
+        with the agent's configuration, it allows resuming training exactly where it stopped.
+
+        :return: training state
+        :rtype: dict
+        """
+        return self._get_rng_state()
+
+    def load_state_dict(self, state: dict) -> None:
+        """Restores a training state returned by state_dict() of an agent with the same configuration.
+
+        :param state: training state
+        :type state: dict
+        """
+        self._set_rng_state(state)
+
+    def _get_rng_state(self) -> dict:
+        # states of all the RNGs used by the agent, which are part of state_dict()
+        torch = _loaded_torch()
+        state = {
+            "rng": self._rng.get_state(),
+            "environment_rng": self.environment.unwrapped.np_random.bit_generator.state,
+            "action_space_rng": self.environment.action_space.np_random.bit_generator.state,
+            "torch_rng": torch.get_rng_state() if torch is not None else None,
+            "cuda_rng": torch.cuda.get_rng_state_all() if torch is not None and torch.cuda.is_available() else None
+        }
+        return state
+
+    def _set_rng_state(self, state: dict) -> None:
+        self._rng.set_state(state["rng"])
+        self.environment.unwrapped.np_random.bit_generator.state = state["environment_rng"]
+        self.environment.action_space.np_random.bit_generator.state = state["action_space_rng"]
+        if state["torch_rng"] is not None:
+            import torch
+            torch.set_rng_state(state["torch_rng"])
+            if state["cuda_rng"] is not None:
+                torch.cuda.set_rng_state_all(state["cuda_rng"])
+
     def _train_or_test(
             self,
             n_episodes: int,
             train: bool,
             render: bool = False,
-            early_stop_reward: float | None = None
-    ) -> dict:
+            early_stop_reward: float | None = None,
+            action_repeat: int = 1,
+            progress_period: int = 1,
+            metrics: MetricRecorder | None = None,
+            profiler: Profiler | None = None,
+            callbacks: list[Callback] | None = None,
+            resume_from: str | Path | None = None,
+            episode_seeds: list[int] | None = None,
+            progress: bool = True
+    ) -> MetricRecorder:
         assert not (train and render)
-        stats = defaultdict(list)
-        episodes = trange(1, n_episodes + 1, desc='Episode: ', leave=True)
-
-        for episode in episodes:
-            # Reset environment data and initialize variables
-            done = False
-            state = self.environment.reset()
-            episode_reward = 0
-            episode_length = 0
-            if render:
-                self.environment.render()
-
-            # Run episode
-            while not done:
-                # Interact with the environment
-                action = self.compute_action(state=state, episode=episode, explore=train)
-                next_state, reward, done, _ = self.environment.step(action)
+        assert episode_seeds is None or (not train and len(episode_seeds) == n_episodes)
+        assert action_repeat > 0 and progress_period > 0
+        stats = metrics if metrics is not None else MetricRecorder()
+        callbacks = callbacks if callbacks is not None else []
+        step_callbacks = get_hook_callbacks(callbacks, "on_step")
+        update_callbacks = get_hook_callbacks(callbacks, "on_update")
+        episode_end_callbacks = get_hook_callbacks(callbacks, "on_episode_end")
+        avg_episode_reward = RunningAverage()
+        avg_episode_length = RunningAverage()
+        first_episode = 1
+
+        # Restore the state of the training loop
+        if resume_from is not None:
+            checkpoint = load_checkpoint(resume_from)
+            self.load_state_dict(checkpoint["agent"])
+            stats.load_state_dict(checkpoint["stats"])
+            for episode_reward, episode_length in zip(stats["episode_reward"], stats["episode_length"]):
+                avg_episode_reward.append(episode_reward)
+                avg_episode_length.append(episode_length)
+            first_episode = checkpoint["episode"] + 1
+
+        episodes = trange(
+            first_episode, n_episodes + 1,
+            initial=first_episode - 1, total=n_episodes, desc='Episode: ', leave=True, disable=not progress
+        )
+        self._profiler = profiler
+
+        try:
+            for episode in episodes:
+                # Reset environment data and initialize variables
+                if episode_seeds is not None:
+                    self.seed(episode_seeds[episode - 1])
+                    self.environment.action_space.seed(episode_seeds[episode - 1])
+                done = False
+                state = self.environment.reset()
+                episode_reward = 0
+                episode_length = 0
                 if render:
                     self.environment.render()
+                if profiler is not None:
+                    profiler.start_episode(episode)
+
+                # Run episode
+                while not done:
+                    # Interact with the environment, repeating the action (the experience covers all the repetitions)
+                    if profiler is not None:
+                        t = profiler.tic()
+                    action = self.compute_action(state=state, episode=episode, explore=train)
+                    if profiler is not None:
+                        t = profiler.toc("compute_action", t)
+                    reward = 0
+                    for _ in range(action_repeat):
+                        next_state, frame_reward, done, _ = self.environment.step(action)
+                        reward += frame_reward
+                        episode_length += 1
+                        if render:
+                            self.environment.render()
+                        if done:
+                            break
+                    if profiler is not None:
+                        t = profiler.toc("environment_step", t)
+
+                    # Update policy
+                    if train:
+                        experience = Experience(
+                            episode=episode,
+                            state=state,
+                            action=action,
+                            reward=reward,
+                            next_state=next_state,
+                            done=done
+                        )
+                        self.record_experience(experience)
+                        if profiler is not None:
+                            t = profiler.toc("record_experience", t)
+                        update_stats = self.update()
+                        if profiler is not None:
+                            profiler.toc("update", t)
+                            profiler.count(updates=int(len(update_stats) > 0))
+
+                        # Update stats
+                        stats.record(update_stats)
+
+                        # Callbacks
+                        for callback in step_callbacks:
+                            callback.on_step(self, experience)
+                        if update_stats:
+                            for callback in update_callbacks:
+                                callback.on_update(self, update_stats)
+                    episode_reward += reward
+
+                    # Update state
+                    state = next_state
+
+                # Update stats
+                stats.append("episode_reward", episode_reward)
+                stats.append("episode_length", episode_length)
+                avg_episode_reward.append(episode_reward)
+                avg_episode_length.append(episode_length)
+                if profiler is not None:
+                    profiler.count(steps=episode_length)
+                    profiler.end_episode(episode, stats)
 
-                # Update policy
-                if train:
-                    experience = Experience(
-                        episode=episode,
-                        state=state,
-                        action=action,
-                        reward=reward,
-                        next_state=next_state,
-                        done=done
+                # Show progress
+                if episode % progress_period == 0 or episode == n_episodes:
+                    episodes.set_description(
+                        f"Episode {episode} - "
+                        f"Reward: {episode_reward:.1f} - "
+                        f"Length: {episode_length} - "
+                        f"Avg reward: {avg_episode_reward.value:.1f} - "
+                        f"Avg length: {avg_episode_length.value:.1f}"
                     )
-                    self.record_experience(experience)
-                    update_stats = self.update()
-
-                    # Update stats
-                    for k, v in update_stats.items():
-                        if isinstance(v, list):
-                            stats[k].extend(v)
-                        else:
-                            stats[k].append(v)
-                episode_reward += reward
-                episode_length += 1
-
-                # Update state
-                state = next_state
-
-            # Update stats
-            stats["episode_reward"].append(episode_reward)
-            stats["episode_length"].append(episode_length)
-
-            # Show progress
-            avg_episode_length = running_average(stats["episode_length"])[-1]
-            avg_episode_reward = running_average(stats["episode_reward"])[-1]
-            episodes.set_description(
-                f"Episode {episode} - "
-                f"Reward: {episode_reward:.1f} - "
-                f"Length: {episode_length} - "
-                f"Avg reward: {avg_episode_reward:.1f} - "
-                f"Avg length: {avg_episode_length:.1f}"
-            )
 
-            if early_stop_reward is not None and avg_episode_reward >= early_stop_reward:
-                print("Early stopping: environment solved!")
-                break
+                # Callbacks (all of them are called, then training stops if any of them asks to)
+                stop = any([callback.on_episode_end(self, episode, stats) for callback in episode_end_callbacks])
+
+                if early_stop_reward is not None and avg_episode_reward.value >= early_stop_reward:
+                    print("Early stopping: environment solved!")
+                    break
+                if stop:
+                    break
+        finally:
+            self._profiler = None
+            if profiler is not None:
+                profiler.stop_capture()
 
+        stats.close()
+        for callback in callbacks:
+            callback.on_train_end(self, stats)
         return stats
+
+    def _test_in_parallel(
+            self,
+            episode_seeds: list[int],
+            n_workers: int,
+            action_repeat: int,
+            metrics: MetricRecorder | None
+    ) -> MetricRecorder:
+        # The workers rebuild the agent from its configuration and the part of its state needed for evaluation (e.g.,
+        # without replay buffer and optimizer), and the environment with gym.make() if possible (e.g., Box2D
+        # environments cannot be pickled)
+        environment = get_make_arguments(self.environment) or self.environment
+        state = self._get_state(include_replay_buffer=False, include_optimizer=False)
+
+        # Contiguous shards of episodes, so that the stats are concatenated in episode order
+        shards = [shard.tolist() for shard in np.array_split(np.asarray(episode_seeds), n_workers) if len(shard) > 0]
+        context = mp.get_context("spawn")
+        results = [None] * len(shards)
+        episodes = tqdm(total=len(episode_seeds), desc='Episode: ', leave=True)
+        with ProcessPoolExecutor(max_workers=len(shards), mp_context=context) as pool:
+            futures = {
+                pool.submit(
+                    _run_test_worker,
+                    agent_class=type(self),
+                    config=self._get_config(),
+                    state=state,
+                    environment=environment,
+                    episode_seeds=shard,
+                    action_repeat=action_repeat
+                ): i
+                for i, shard in enumerate(shards)
+            }
+            for future in as_completed(futures):
+                i = futures[future]
+                results[i] = future.result()
+                episodes.update(len(shards[i]))
+        episodes.close()
+
+        stats = metrics if metrics is not None else MetricRecorder()
+        for result in results:
+            for metric_name, values in result.items():
+                stats.extend(metric_name, values)
+        stats.close()
+        return stats
+
+
+def _loaded_torch():
+    # PyTorch, if it has been imported (by the agents using it). Otherwise, its RNG is not used and does not need to be
+    # seeded or saved, so tabular agents do not import it.
+    return sys.modules.get("torch")
+
+
+def _run_test_worker(
+        *,
+        agent_class: type,
+        config: dict,
+        state: dict,
+        environment: gym.Env | dict,
+        episode_seeds: list[int],
+        action_repeat: int
+) -> dict:
+    torch = _loaded_torch()
+    if torch is not None:
+        torch.set_num_threads(1)    # the cores are shared with the other workers
+    environment = make_environment(environment) if isinstance(environment, dict) else environment
+    agent = agent_class._from_state(environment=environment, config=config, state=state)
+    stats = agent._train_or_test(
+        n_episodes=len(episode_seeds),
+        train=False,
+        action_repeat=action_repeat,
+        episode_seeds=episode_seeds,
+        progress=False
+    )
+    return {metric_name: np.asarray(values) for metric_name, values in stats.items()}
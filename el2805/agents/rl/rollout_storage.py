@@ -0,0 +1,126 @@
+import numpy as np
+import torch
+from el2805.agents.rl.utils import Experience
+
+
+class RolloutStorage:
+    """Storage of the experiences collected by an on-policy agent since the last update, as preallocated tensors that
+    grow when needed and are reused across updates. Besides the experiences, it stores the log-likelihood of each
+    action and, optionally, the value of each state, both computed when the action was taken."""
+
+    def __init__(self, *, state_dim: int, action_dim: int, capacity: int = 1024):
+        """Initializes a RolloutStorage.
+
+        :param state_dim: dimension of the state space
+        :type state_dim: int
+        :param action_dim: dimension of the action space
+        :type action_dim: int
+        :param capacity: initial number of experiences that fit in the storage, doubled whenever it is full
+        :type capacity: int, optional
+        """
+        assert capacity > 0
+        self.state_dim = state_dim
+        self.action_dim = action_dim
+        self.capacity = capacity
+
+        self._states = torch.zeros((capacity, state_dim), dtype=torch.float64)
+        self._actions = torch.zeros((capacity, action_dim), dtype=torch.float64)
+        self._rewards = torch.zeros(capacity, dtype=torch.float64)
+        self._dones = torch.zeros(capacity, dtype=torch.bool)
+        self._log_probs = torch.zeros(capacity, dtype=torch.float64)
+        self._values = torch.zeros(capacity, dtype=torch.float64)
+        self._size = 0
+        self._has_values = True     # whether the values of all the stored states are known
+        self.last_next_state = None
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def last_done(self) -> bool:
+        """Whether the last stored experience ends an episode (False if the storage is empty)."""
+        return self._size > 0 and bool(self._dones[self._size - 1])
+
+    def append(self, experience: Experience, log_prob: float | torch.Tensor, value: float | torch.Tensor | None = None):
+        """Stores a new experience, growing the storage if it is full.
+
+        :param experience: new experience
+        :type experience: Experience
+        :param log_prob: log-likelihood of the action under the policy that took it
+        :type log_prob: float or torch.Tensor
+        :param value: value of the state, if known
+        :type value: float or torch.Tensor, optional
+        """
+        if self._size == self.capacity:
+            self._grow()
+        i = self._size
+        self._states[i] = torch.as_tensor(experience.state, dtype=torch.float64)
+        self._actions[i] = torch.as_tensor(np.reshape(experience.action, -1), dtype=torch.float64)
+        self._rewards[i] = float(experience.reward)
+        self._dones[i] = bool(experience.done)
+        self._log_probs[i] = log_prob
+        if value is not None:
+            self._values[i] = value
+        else:
+            self._has_values = False
+        self.last_next_state = experience.next_state
+        self._size += 1
+
+    def tensors(self) -> tuple[torch.Tensor, ...]:
+        """Returns the stored data as views (no copy), valid until the storage is modified.
+
+        :return: (states, actions, rewards, dones, log_probs, values), where values is None if not all the values are
+            known
+        :rtype: tuple[torch.Tensor, ...]
+        """
+        n = self._size
+        values = self._values[:n] if self._has_values else None
+        return self._states[:n], self._actions[:n], self._rewards[:n], self._dones[:n], self._log_probs[:n], values
+
+    def clear(self) -> None:
+        """Removes all the experiences, keeping the allocated memory."""
+        self._size = 0
+        self._has_values = True
+        self.last_next_state = None
+
+    def state_dict(self) -> dict:
+        """Returns the stored data.
+
+        :return: state of the storage
+        :rtype: dict
+        """
+        n = self._size
+        # copies, otherwise torch.save() would write the whole preallocated storage of the views
+        return {
+            "states": self._states[:n].clone(),
+            "actions": self._actions[:n].clone(),
+            "rewards": self._rewards[:n].clone(),
+            "dones": self._dones[:n].clone(),
+            "log_probs": self._log_probs[:n].clone(),
+            "values": self._values[:n].clone(),
+            "has_values": self._has_values,
+            "last_next_state": self.last_next_state
+        }
+
+    def load_state_dict(self, state: dict) -> None:
+        """Replaces the stored data with the one of a state returned by state_dict(), growing the storage if needed.
+
+        :param state: state of the storage
+        :type state: dict
+        """
+        n = len(state["states"])
+        while self.capacity < n:
+            self._grow()
+        for name in ("states", "actions", "rewards", "dones", "log_probs", "values"):
+            getattr(self, f"_{name}")[:n] = torch.as_tensor(state[name])
+        self._size = n
+        self._has_values = state["has_values"]
+        self.last_next_state = state["last_next_state"]
+
+    def _grow(self) -> None:
+        self.capacity *= 2
+        for name in ("_states", "_actions", "_rewards", "_dones", "_log_probs", "_values"):
+            tensor = getattr(self, name)
+            grown = torch.zeros((self.capacity,) + tensor.shape[1:], dtype=tensor.dtype)
+            grown[:len(tensor)] = tensor
+            setattr(self, name, grown)
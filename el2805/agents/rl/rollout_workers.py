@@ -0,0 +1,213 @@
+import gym
+import numpy as np
+import torch
+import torch.multiprocessing as mp
+from copy import deepcopy
+from tqdm import tqdm
+from el2805.agents.utils import RunningAverage
+from el2805.agents.rl.metric_recorder import MetricRecorder
+from el2805.agents.rl.torch_utils import normal_log_pdf
+from el2805.utils import get_make_arguments, make_environment
+
+
+class RolloutWorkers:
+    """Parallel rollout collection for PPO. Several worker processes interact with their own seeded copy of the
+    environment, using a CPU copy of the actor, and return their trajectories as compact arrays. After each update,
+    the learner (the calling process) sends the new weights of the actor to the workers.
+
+    Each worker collects rollout_length steps per update (one episode if the agent has no rollout length), so each
+    update uses n_workers times more experience than in serial training."""
+
+    def __init__(self, agent, *, n_workers: int, seed: int | None = None):
+        """Initializes a RolloutWorkers.
+
+        :param agent: PPO agent to train
+        :type agent: PPO
+        :param n_workers: number of worker processes
+        :type n_workers: int
+        :param seed: seed used to generate the seeds of the workers
+        :type seed: int, optional
+        """
+        assert n_workers > 0
+        self.agent = agent
+        self.n_workers = n_workers
+        self.seed = seed
+
+    def train(
+            self,
+            n_episodes: int,
+            early_stop_reward: float | None = None,
+            metrics: MetricRecorder | None = None
+    ) -> MetricRecorder:
+        """Trains the PPO agent for the specified number of episodes (completed by any of the workers).
+
+        :param n_episodes: number of training episodes
+        :type n_episodes: int
+        :param early_stop_reward: average reward considered as problem solved
+        :type early_stop_reward: float, optional
+        :param metrics: recorder where to store the training stats, if None they are kept in memory
+        :type metrics: MetricRecorder, optional
+        :return: training stats (per episode or per update, depending on the metric)
+        :rtype: MetricRecorder
+        """
+        agent = self.agent
+        context = mp.get_context("spawn")
+        environment = get_make_arguments(agent.environment) or agent.environment
+        actor = deepcopy(agent.actor).cpu()
+        seeds = [s.generate_state(1)[0] for s in np.random.SeedSequence(self.seed).spawn(self.n_workers)]
+
+        connections = []
+        workers = []
+        for seed in seeds:
+            connection, worker_connection = context.Pipe()
+            worker = context.Process(
+                target=_run_worker,
+                kwargs={
+                    "environment": environment,
+                    "seed": int(seed),
+                    "actor": actor,
+                    "rollout_length": agent.rollout_length,
+                    "connection": worker_connection
+                },
+                daemon=True
+            )
+            worker.start()
+            worker_connection.close()   # otherwise receiving from a dead worker would block instead of failing
+            connections.append(connection)
+            workers.append(worker)
+
+        stats = metrics if metrics is not None else MetricRecorder()
+        running_reward = RunningAverage()
+        episodes = tqdm(total=n_episodes, desc='Episode: ', leave=True)
+        try:
+            solved = False
+            while stats.n_values("episode_reward") < n_episodes and not solved:
+                # Broadcast weights and collect rollouts (in worker order, for reproducibility)
+                state_dict = {k: v.cpu() for k, v in agent.actor.state_dict().items()}
+                for connection in connections:
+                    connection.send(state_dict)
+                rollouts = [_receive(connection, worker) for connection, worker in zip(connections, workers)]
+
+                # Update stats of the completed episodes
+                for rollout in rollouts:
+                    for episode_reward, episode_length in rollout["episodes"]:
+                        if stats.n_values("episode_reward") == n_episodes or solved:
+                            break
+                        stats.append("episode_reward", episode_reward)
+                        stats.append("episode_length", episode_length)
+                        avg_episode_reward = running_reward.append(episode_reward)
+                        episodes.update()
+                        episodes.set_description(
+                            f"Episode {stats.n_values('episode_reward')} - "
+                            f"Reward: {episode_reward:.1f} - "
+                            f"Length: {episode_length} - "
+                            f"Avg reward: {avg_episode_reward:.1f}"
+                        )
+                        solved = early_stop_reward is not None and avg_episode_reward >= early_stop_reward
+                if solved:
+                    print("Early stopping: environment solved!")
+                    break
+
+                # Update the networks with the rollouts of all the workers
+                update_stats = agent._update_from_rollout(
+                    **{
+                        k: torch.as_tensor(
+                            data=np.concatenate([rollout[k] for rollout in rollouts]),
+                            device=agent.device
+                        )
+                        for k in ("states", "actions", "rewards", "dones", "log_probs", "truncated",
+                                  "truncated_next_states")
+                    }
+                )
+                stats.record(update_stats)
+        finally:
+            # A dead worker cannot be stopped (and its error must not be hidden by a broken pipe)
+            for connection, worker in zip(connections, workers):
+                if worker.exitcode is None:
+                    try:
+                        connection.send(None)
+                    except (BrokenPipeError, EOFError):
+                        pass
+            for worker in workers:
+                worker.join(timeout=10)
+                if worker.is_alive():
+                    worker.terminate()
+            episodes.close()
+            stats.close()
+
+        return stats
+
+
+def _receive(connection, worker: mp.Process) -> dict:
+    try:
+        return connection.recv()
+    except EOFError:
+        worker.join(timeout=10)
+        raise RuntimeError(f"Rollout worker terminated with exit code {worker.exitcode}") from None
+
+
+def _run_worker(
+        *,
+        environment: gym.Env | dict,
+        seed: int,
+        actor: torch.nn.Module,
+        rollout_length: int | None,
+        connection
+) -> None:
+    torch.set_num_threads(1)    # the cores are shared with the learner and the other workers
+    torch.manual_seed(seed)
+    if isinstance(environment, dict):
+        environment = make_environment(environment)
+    environment.seed(seed)
+    state_dim = len(environment.observation_space.low)
+
+    # The episode in progress continues in the next rollout
+    state = environment.reset()
+    episode_reward = 0
+    episode_length = 0
+
+    while (state_dict := connection.recv()) is not None:
+        actor.load_state_dict(state_dict)
+        states, actions, rewards, dones, log_probs = [], [], [], [], []
+        episodes = []
+        done = False
+        while (rollout_length is None and not done) or (rollout_length is not None and len(states) < rollout_length):
+            with torch.no_grad():
+                mean, var = actor(torch.as_tensor(state.reshape((1,) + state.shape), dtype=torch.float64))
+                mean, var = mean.reshape(-1), var.reshape(-1)
+                action = torch.normal(mean, torch.sqrt(var))
+                log_prob = normal_log_pdf(action, mean, var).sum()     # assumption: independent action dimensions
+                action = action.numpy()
+            next_state, reward, done, _ = environment.step(action)
+
+            states.append(state)
+            actions.append(action)
+            rewards.append(reward)
+            dones.append(done)
+            log_probs.append(log_prob.item())
+            episode_reward += reward
+            episode_length += 1
+
+            if done:
+                episodes.append((episode_reward, episode_length))
+                state = environment.reset()
+                episode_reward = 0
+                episode_length = 0
+            else:
+                state = next_state
+
+        # If the last episode is not over, its next state is needed to bootstrap
+        truncated = np.zeros(len(states), dtype=bool)
+        truncated[-1] = not done
+        connection.send({
+            "states": np.asarray(states, dtype=np.float64),
+            "actions": np.asarray(actions, dtype=np.float64),
+            "rewards": np.asarray(rewards, dtype=np.float64),
+            "dones": np.asarray(dones, dtype=bool),
+            "log_probs": np.asarray(log_probs, dtype=np.float64),
+            "truncated": truncated,
+            "truncated_next_states": np.asarray([] if done else [state], dtype=np.float64).reshape(-1, state_dim),
+            "episodes": episodes
+        })
+
+    environment.close()
@@ -0,0 +1,114 @@
+import torch
+
+
+def get_device():
+    if torch.cuda.is_available():
+        device = "cuda"
+    # elif torch.has_mps:
+    #     device = "mps"
+    else:
+        device = "cpu"
+    return device
+
+
+def normal_pdf(x, mean, var):
+    pdf = 1 / torch.sqrt(2 * torch.pi * var) * torch.exp(-1/2 * (x - mean)**2 / var)
+    return pdf
+
+
+def normal_log_pdf(x, mean, var):
+    log_pdf = -1/2 * ((x - mean)**2 / var + torch.log(2 * torch.pi * var))
+    return log_pdf
+
+
+def compile_for_inference(
+        module: torch.nn.Module,
+        example_input: torch.Tensor,
+        mode: str,
+        methods: tuple[str, ...] = ("forward",)
+) -> torch.nn.Module:
+    """Compiles a module with TorchScript (tracing) to run inference with lower Python overhead.
+
+    :param module: module to compile
+    :type module: torch.nn.Module
+    :param example_input: example input used to trace the module (e.g., a batch of one state)
+    :type example_input: torch.Tensor
+    :param mode: "eager" (no compilation, the module itself), "trace" (traced module, sharing the parameters with the
+        original one, so it reflects later updates), or "frozen" (traced module in eval mode with the parameters folded
+        as constants, so it must be compiled again after each update)
+    :type mode: str
+    :param methods: methods to compile
+    :type methods: tuple[str, ...], optional
+    :return: compiled module
+    :rtype: torch.nn.Module
+    """
+    if mode == "eager":
+        return module
+    elif mode not in ("trace", "frozen"):
+        raise NotImplementedError
+
+    with torch.no_grad():
+        compiled = torch.jit.trace_module(module, {method: example_input for method in methods})
+    if mode == "frozen":
+        compiled = torch.jit.freeze(compiled.eval(), preserved_attrs=[m for m in methods if m != "forward"])
+    return compiled
+
+
+class MultiLayerPerceptron(torch.nn.Module):
+    def __init__(
+            self,
+            *,
+            input_size: int,
+            hidden_layer_sizes: list[int],
+            hidden_layer_activation: str,
+            output_size: int | None = None,
+            output_layer_activation: str | None = None,
+            include_top: bool = False
+    ):
+        super().__init__()
+        self.input_size = input_size
+        self.hidden_layer_sizes = hidden_layer_sizes
+        self.hidden_layer_activation = hidden_layer_activation
+        self.output_size = output_size
+        self.output_layer_activation = output_layer_activation
+        self.include_top = include_top
+
+        # Hidden layers
+        self._hidden_layers = []
+        input_size = self.input_size
+        for hidden_layer_size in self.hidden_layer_sizes:
+            self._hidden_layers.append(torch.nn.Linear(input_size, hidden_layer_size))
+            if hidden_layer_activation == "relu":
+                self._hidden_layers.append(torch.nn.ReLU())
+            elif hidden_layer_activation == "tanh":
+                self._hidden_layers.append(torch.nn.Tanh())
+            else:
+                raise NotImplementedError
+            input_size = hidden_layer_size
+        self._hidden_layers = torch.nn.Sequential(*self._hidden_layers)
+
+        # Output layer
+        assert not (include_top and output_size is None)
+        if self.include_top:
+            self._output_layer = torch.nn.Linear(input_size, self.output_size)
+
+            if self.output_layer_activation == "sigmoid":
+                output_activation = torch.nn.Sigmoid()
+            elif self.output_layer_activation == "tanh":
+                output_activation = torch.nn.Tanh()
+            else:
+                output_activation = None
+                if self.output_layer_activation is not None:
+                    raise NotImplementedError
+
+            if output_activation is not None:
+                self._output_layer = torch.nn.Sequential(self._output_layer, output_activation)
+        else:
+            self._output_layer = None
+
+    def forward(self, x):
+        for hidden_layer in self._hidden_layers:
+            x = hidden_layer(x)
+        if self.include_top:
+            x = self._output_layer(x)
+        return x
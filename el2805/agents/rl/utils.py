@@ -1,5 +1,4 @@
 import numpy as np
-import torch
 from typing import NamedTuple
 
 
@@ -34,21 +33,6 @@ def get_epsilon(
     return epsilon
 
 
-def get_device():
-    if torch.cuda.is_available():
-        device = "cuda"
-    # elif torch.has_mps:
-    #     device = "mps"
-    else:
-        device = "cpu"
-    return device
-
-
-def normal_pdf(x, mean, var):
-    pdf = 1 / torch.sqrt(2 * torch.pi * var) * torch.exp(-1/2 * (x - mean)**2 / var)
-    return pdf
-
-
 class Experience(NamedTuple):
     episode: int
     state: np.ndarray
@@ -58,61 +42,12 @@ class Experience(NamedTuple):
     done: bool
 
 
-class MultiLayerPerceptron(torch.nn.Module):
-    def __init__(
-            self,
-            *,
-            input_size: int,
-            hidden_layer_sizes: list[int],
-            hidden_layer_activation: str,
-            output_size: int | None = None,
-            output_layer_activation: str | None = None,
-            include_top: bool = False
-    ):
-        super().__init__()
-        self.input_size = input_size
-        self.hidden_layer_sizes = hidden_layer_sizes
-        self.hidden_layer_activation = hidden_layer_activation
-        self.output_size = output_size
-        self.output_layer_activation = output_layer_activation
-        self.include_top = include_top
-
-        # Hidden layers
-        self._hidden_layers = []
-        input_size = self.input_size
-        for hidden_layer_size in self.hidden_layer_sizes:
-            self._hidden_layers.append(torch.nn.Linear(input_size, hidden_layer_size))
-            if hidden_layer_activation == "relu":
-                self._hidden_layers.append(torch.nn.ReLU())
-            elif hidden_layer_activation == "tanh":
-                self._hidden_layers.append(torch.nn.Tanh())
-            else:
-                raise NotImplementedError
-            input_size = hidden_layer_size
-        self._hidden_layers = torch.nn.Sequential(*self._hidden_layers)
-
-        # Output layer
-        assert not (include_top and output_size is None)
-        if self.include_top:
-            self._output_layer = torch.nn.Linear(input_size, self.output_size)
-
-            if self.output_layer_activation == "sigmoid":
-                output_activation = torch.nn.Sigmoid()
-            elif self.output_layer_activation == "tanh":
-                output_activation = torch.nn.Tanh()
-            else:
-                output_activation = None
-                if self.output_layer_activation is not None:
-                    raise NotImplementedError
+# Utilities based on PyTorch, imported at the first access (PEP 562) so that importing this module does not import torch
+_TORCH_UTILS = ("get_device", "normal_pdf", "normal_log_pdf", "compile_for_inference", "MultiLayerPerceptron")
 
-            if output_activation is not None:
-                self._output_layer = torch.nn.Sequential(self._output_layer, output_activation)
-        else:
-            self._output_layer = None
 
-    def forward(self, x):
-        for hidden_layer in self._hidden_layers:
-            x = hidden_layer(x)
-        if self.include_top:
-            x = self._output_layer(x)
-        return x
+def __getattr__(name: str):
+    if name in _TORCH_UTILS:
+        from el2805.agents.rl import torch_utils
+        return getattr(torch_utils, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,4 +1,6 @@
 import numpy as np
+from statistics import NormalDist
+from typing import Callable, Iterable, NamedTuple
 
 
 def running_average(data, window_length: int = 50):
@@ -7,3 +9,157 @@ def running_average(data, window_length: int = 50):
     averages = (np.convolve(data, window) / overlap_length)[:-(window_length-1)]
     assert len(averages) == len(data)
     return averages
+
+
+class RunningAverage:
+    """Incremental version of running_average(), which keeps the last values in a ring buffer together with their sum,
+    so that each new value costs O(1) instead of a convolution over the whole history."""
+
+    def __init__(self, window_length: int = 50):
+        """Initializes a RunningAverage.
+
+        :param window_length: number of last values averaged
+        :type window_length: int, optional
+        """
+        assert window_length > 0
+        self.window_length = window_length
+        self._window = np.zeros(window_length)
+        self._n_values = 0
+        self._sum = 0
+
+    def append(self, value: float) -> float:
+        """Adds a new value and returns the average of the last window_length values (of all the values, if fewer).
+
+        :param value: new value
+        :type value: float
+        :return: running average, as the last element of running_average() on all the values
+        :rtype: float
+        """
+        i = self._n_values % self.window_length
+        self._sum += value - self._window[i]
+        self._window[i] = value
+        self._n_values += 1
+        if i == self.window_length - 1:
+            self._sum = self._window.sum()  # prevents the accumulation of rounding errors, once per window
+        return self.value
+
+    @property
+    def value(self) -> float:
+        return self._sum / min(self._n_values, self.window_length) if self._n_values > 0 else np.nan
+
+
+class RunningStatistics:
+    """Running mean and variance of a stream of values, updated with Welford's algorithm, which is numerically stable
+    and costs O(1) per value."""
+
+    def __init__(self):
+        self.n_values = 0
+        self._mean = 0.
+        self._m2 = 0.      # sum of squared deviations from the mean
+
+    def append(self, value: float) -> None:
+        """Adds a new value.
+
+        :param value: new value
+        :type value: float
+        """
+        self.n_values += 1
+        delta = value - self._mean
+        self._mean += delta / self.n_values
+        self._m2 += delta * (value - self._mean)
+
+    def extend(self, values: Iterable[float]) -> None:
+        """Adds new values.
+
+        :param values: new values
+        :type values: Iterable[float]
+        """
+        for value in values:
+            self.append(value)
+
+    @property
+    def mean(self) -> float:
+        return self._mean if self.n_values > 0 else np.nan
+
+    @property
+    def variance(self) -> float:
+        # sample variance (unbiased)
+        return self._m2 / (self.n_values - 1) if self.n_values > 1 else np.nan
+
+    @property
+    def std(self) -> float:
+        return np.sqrt(self.variance)
+
+
+class SequentialEstimate(NamedTuple):
+    mean: float
+    confidence: float   # half-width of the confidence interval
+    n_episodes: int
+
+    @property
+    def interval(self) -> tuple[float, float]:
+        return self.mean - self.confidence, self.mean + self.confidence
+
+
+def sequential_estimate(
+        run_episodes: Callable[[range], Iterable[float]],
+        *,
+        threshold: float | None = None,
+        target_confidence: float | None = None,
+        batch_size: int,
+        min_episodes: int,
+        max_episodes: int,
+        confidence_level: float = .95
+) -> SequentialEstimate:
+    """Estimates the mean value of a per-episode quantity (e.g., episode reward) running batches of episodes, until the
+    estimate is accurate enough for its purpose. The confidence interval is (mean - confidence, mean + confidence),
+    with confidence = z * std / sqrt(n), assuming that the sample mean has Gaussian distribution.
+
+    The evaluation stops, after at least min_episodes episodes, as soon as the confidence interval is entirely above or
+    below the threshold, or the confidence is at most target_confidence. Otherwise, it stops after max_episodes
+    episodes. So, clearly good or clearly bad agents are evaluated with fewer episodes.
+
+    Since the interval is checked after each batch, z is adjusted for the number of checks k (Bonferroni correction):
+    each interval has confidence level 1 - alpha/k, where alpha = 1 - confidence_level, so that the probability that
+    any of them misses the mean (e.g., a false pass) is at most alpha.
+
+    :param run_episodes: function running the given episodes (numbered from 1) and returning their values
+    :type run_episodes: Callable[[range], Iterable[float]]
+    :param threshold: value to compare with the mean (e.g., reward for passing a test)
+    :type threshold: float, optional
+    :param target_confidence: half-width of the confidence interval that is accurate enough
+    :type target_confidence: float, optional
+    :param batch_size: number of episodes run between two checks of the stopping conditions
+    :type batch_size: int
+    :param min_episodes: minimum number of episodes, so that the sample variance is reliable
+    :type min_episodes: int
+    :param max_episodes: maximum number of episodes
+    :type max_episodes: int
+    :param confidence_level: overall confidence level, for all the checks together
+    :type confidence_level: float, optional
+    :return: estimate of the mean, confidence and number of episodes run
+    :rtype: SequentialEstimate
+    """
+    assert batch_size > 0 and 1 < min_episodes <= max_episodes and 0 < confidence_level < 1
+    batch_ends = list(range(batch_size, max_episodes, batch_size)) + [max_episodes]
+    n_checks = sum(n_episodes >= min_episodes for n_episodes in batch_ends)
+    alpha = (1 - confidence_level) / n_checks
+    z = NormalDist().inv_cdf(1 - alpha / 2)
+
+    statistics = RunningStatistics()
+    confidence = np.inf
+    while statistics.n_values < max_episodes:
+        first_episode = statistics.n_values + 1
+        last_episode = min(statistics.n_values + batch_size, max_episodes)
+        statistics.extend(run_episodes(range(first_episode, last_episode + 1)))
+        assert statistics.n_values == last_episode
+
+        if statistics.n_values >= min_episodes:
+            confidence = z * statistics.std / np.sqrt(statistics.n_values)
+            if threshold is not None and \
+                    (statistics.mean - confidence >= threshold or statistics.mean + confidence < threshold):
+                break
+            if target_confidence is not None and confidence <= target_confidence:
+                break
+
+    return SequentialEstimate(mean=statistics.mean, confidence=confidence, n_episodes=statistics.n_values)
@@ -1,5 +1,10 @@
-from el2805.envs.tabular_rl_problem import TabularRLProblem
-from el2805.envs.tabular_mdp import TabularMDP
-from el2805.envs.maze import Maze
-from el2805.envs.minotaur_maze import MinotaurMaze
-from el2805.envs.plucking_berries import PluckingBerries
+from el2805.utils import lazy_attributes
+
+__all__ = ["TabularRLProblem", "TabularMDP", "Maze", "MinotaurMaze", "PluckingBerries"]
+__getattr__, __dir__ = lazy_attributes(__name__, {
+    "TabularRLProblem": "tabular_rl_problem",
+    "TabularMDP": "tabular_mdp",
+    "Maze": "maze",
+    "MinotaurMaze": "minotaur_maze",
+    "PluckingBerries": "plucking_berries"
+})
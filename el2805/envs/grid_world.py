@@ -1,9 +1,9 @@
 import numpy as np
 import gym
 from abc import ABC, abstractmethod
+from copy import deepcopy
 from pathlib import Path
 from enum import IntEnum
-from termcolor import colored
 from el2805.envs.tabular_mdp import TabularMDP
 
 
@@ -36,6 +36,10 @@ Position = tuple[int, int]
 class GridWorld(TabularMDP, ABC):
     action_space = gym.spaces.Discrete(len(Move))
 
+    # Model of the environment (map and state space), which never changes after construction. Copies of the environment
+    # (e.g., the one of each agent) share it, and copy only the simulator state (current state, steps, RNG).
+    _model_attributes = ("map", "_states", "_state_to_index")
+
     def __init__(self, map_filepath: Path, horizon: int | None = None):
         super().__init__(horizon)
         self._states = None
@@ -45,8 +49,16 @@ class GridWorld(TabularMDP, ABC):
         self.map = None
         self._load_map(map_filepath)
         assert isinstance(self.map, np.ndarray)
+        self.map.setflags(write=False)
         self.observation_space = gym.spaces.MultiDiscrete(self.map.shape)
 
+    def __deepcopy__(self, memo: dict) -> "GridWorld":
+        environment = self.__class__.__new__(self.__class__)
+        memo[id(self)] = environment
+        for name, value in self.__dict__.items():
+            environment.__dict__[name] = value if name in self._model_attributes else deepcopy(value, memo)
+        return environment
+
     @property
     def states(self) -> list[Position]:
         return self._states
@@ -82,6 +94,7 @@ class GridWorld(TabularMDP, ABC):
         assert mode == "human" or (mode == "policy" and policy is not None)
         map_ = self.map.copy()
         if mode == "human":
+            from termcolor import colored
             map_[self._current_state] = colored("P", color="blue")
         elif mode == "policy":
             for s, action in enumerate(policy):
@@ -3,7 +3,6 @@ import numpy as np
 import itertools as it
 from pathlib import Path
 from enum import Enum, IntEnum
-from termcolor import colored
 from el2805.envs.maze import Maze, MazeCell
 from el2805.envs.grid_world import Move, Position
 from el2805.utils import decide_random
@@ -284,6 +283,7 @@ class MinotaurMaze(Maze):
         assert mode == "human" or (mode == "policy" and policy is not None and policy.shape == self.map.shape)
         map_ = self.map.copy()
         if mode == "human":
+            from termcolor import colored
             player_position, minotaur_position, progress = self._current_state
             if progress is Progress.EATEN:
                 print("LOSER...")
@@ -81,6 +81,15 @@ class TabularRLProblem(gym.Env, ABC):
         """
         return self.horizon is not None
 
+    @property
+    def np_random(self):
+        """Returns the environment's internal RNG (same interface as gym environments).
+
+        :return: RNG
+        :rtype: np.random.Generator
+        """
+        return self._rng
+
     def seed(self, seed: int | None = None) -> list[int]:
         """Sets the seed of the environment's internal RNG.
 
@@ -1,2 +1,69 @@
+import gym
+import importlib
+
+
 def decide_random(rng, probability):
     return rng.binomial(n=1, p=probability) == 1
+
+
+def get_make_arguments(environment: gym.Env) -> dict | None:
+    """Returns the arguments of gym.make() that build a new copy of the environment, including the keyword arguments
+    passed to the environment. Environments that were not created by gym.make(), or that have been wrapped afterwards,
+    cannot be rebuilt this way.
+
+    :param environment: environment
+    :type environment: gym.Env
+    :return: arguments of gym.make() (id and kwargs), or None if the environment cannot be rebuilt from them
+    :rtype: dict, optional
+    """
+    spec = getattr(environment, "spec", None)
+    if spec is None:
+        return None
+
+    # Wrappers added by gym.make(), outermost first
+    wrapper_types = []
+    if spec.max_episode_steps is not None:
+        wrapper_types.append(gym.wrappers.TimeLimit)
+    if spec.order_enforce:
+        wrapper_types.append(gym.wrappers.OrderEnforcing)
+    while isinstance(environment, gym.Wrapper):
+        if len(wrapper_types) == 0 or type(environment) != wrapper_types.pop(0):
+            return None
+        environment = environment.env
+    if len(wrapper_types) > 0:
+        return None
+
+    return {"id": spec.id, "kwargs": dict(spec.kwargs)}
+
+
+def make_environment(make_arguments: dict) -> gym.Env:
+    """Builds an environment from the arguments returned by get_make_arguments().
+
+    :param make_arguments: arguments of gym.make()
+    :type make_arguments: dict
+    :return: environment
+    :rtype: gym.Env
+    """
+    return gym.make(make_arguments["id"], **make_arguments.get("kwargs", {}))
+
+
+def lazy_attributes(package: str, attributes: dict[str, str]):
+    """Returns the module-level __getattr__ and __dir__ (PEP 562) of a package whose attributes are imported from their
+    modules at the first access, so that importing the package does not import the dependencies of all its modules.
+
+    :param package: name of the package
+    :type package: str
+    :param attributes: module (relative to the package) of each attribute
+    :type attributes: dict[str, str]
+    :return: __getattr__ and __dir__ functions
+    :rtype: tuple[callable, callable]
+    """
+    def __getattr__(name: str):
+        if name not in attributes:
+            raise AttributeError(f"module {package!r} has no attribute {name!r}")
+        return getattr(importlib.import_module(f"{package}.{attributes[name]}"), name)
+
+    def __dir__() -> list[str]:
+        return sorted(set(importlib.import_module(package).__dict__) | set(attributes))
+
+    return __getattr__, __dir__
@@ -0,0 +1,88 @@
+import gym
+import numpy as np
+import time
+from el2805.agents.rl import DQN, PPO
+
+SEED = 1
+N_ACTIONS = 5000
+N_WARMUP_ACTIONS = 200
+INFERENCE_MODES = ["eager", "trace", "frozen"]
+DQN_CONFIG = {
+    "seed": SEED,
+    "environment": gym.make("LunarLander-v2"),
+    "discount": .99,
+    "epsilon": .1,
+    "learning_rate": 5e-4,
+    "batch_size": 64,
+    "replay_buffer_size": 10000,
+    "replay_buffer_min": 2000,
+    "target_update_period": 10000 // 64,
+    "hidden_layer_sizes": [64, 64],
+    "hidden_layer_activation": "relu",
+    "gradient_max_norm": 1,
+    "cer": True,
+    "dueling": False,
+    "device": "cpu",
+}
+PPO_CONFIG = {
+    "seed": SEED,
+    "environment": gym.make("LunarLanderContinuous-v2"),
+    "discount": .99,
+    "n_epochs_per_step": 10,
+    "epsilon": .2,
+    "critic_learning_rate": 1e-3,
+    "critic_hidden_layer_sizes": [400, 200],
+    "critic_hidden_layer_activation": "relu",
+    "actor_learning_rate": 1e-5,
+    "actor_shared_hidden_layer_sizes": [400],
+    "actor_mean_hidden_layer_sizes": [200],
+    "actor_var_hidden_layer_sizes": [200],
+    "actor_hidden_layer_activation": "relu",
+    "gradient_max_norm": 1,
+    "device": "cpu",
+}
+
+
+def action_latency(agent, states, **kwargs):
+    for state in states[:N_WARMUP_ACTIONS]:
+        agent.compute_action(state, **kwargs)
+
+    start = time.perf_counter_ns()
+    for state in states:
+        agent.compute_action(state, **kwargs)
+    latency = (time.perf_counter_ns() - start) / len(states) / 1e3    # microseconds per action
+    return latency
+
+
+def benchmark(agent_class, agent_config, **kwargs):
+    state_dim = len(agent_config["environment"].observation_space.low)
+    states = np.random.RandomState(SEED).normal(size=(N_ACTIONS, state_dim))
+
+    baseline = None
+    for inference in INFERENCE_MODES:
+        agent = agent_class(**agent_config, inference=inference)
+        latency = action_latency(agent, states, **kwargs)
+        baseline = latency if baseline is None else baseline
+        print(f"{inference:>8}: {latency:8.1f} us/action (speedup: {baseline / latency:.2f}x)")
+
+
+def main():
+    print("DQN (greedy actions)")
+    benchmark(DQN, DQN_CONFIG, explore=False)
+    print()
+
+    print("DQN (greedy actions, dueling)")
+    benchmark(DQN, DQN_CONFIG | {"dueling": True}, explore=False)
+    print()
+
+    print("PPO")
+    benchmark(PPO, PPO_CONFIG)
+    print()
+
+    print("PPO (shared network)")
+    benchmark(PPO, PPO_CONFIG | {"shared_network": True})
+    print()
+
+
+if __name__ == "__main__":
+    main()
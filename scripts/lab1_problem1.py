@@ -1,18 +1,28 @@
 import numpy as np
 import matplotlib.pyplot as plt
 from pathlib import Path
-from tqdm import trange
 from el2805.envs import MinotaurMaze
 from el2805.envs.grid_world import Move
 from el2805.envs.maze import MazeCell
 from el2805.envs.minotaur_maze import Progress
 from el2805.agents.mdp import MDPAgent, DynamicProgramming, ValueIteration
 from el2805.agents.rl import RLAgent, QLearning, Sarsa
-from utils import print_and_write_line, minotaur_maze_exit_probability, train_rl_agent_one_episode, plot_bar
+from el2805.agents.rl.callbacks import Callback
+from utils import print_and_write_line, minotaur_maze_exit_probability, plot_bar
 
 SEED = 1
 
 
+class ValueSnapshots(Callback):
+    # Records V(s) at the end of each training episode
+    def __init__(self, state):
+        self.state = state
+        self.values = []
+
+    def on_episode_end(self, agent, episode, stats):
+        self.values.append(agent.v(self.state))
+
+
 def task_c(map_filepath, results_dir):
     results_dir.mkdir(parents=True, exist_ok=True)
 
@@ -153,14 +163,10 @@ def task_ij(map_filepath, results_dir):
             seed=SEED
         )
 
-        environment.seed(SEED)
-        values = []
-        for episode in trange(1, n_episodes+1, desc=label):
-            train_rl_agent_one_episode(environment, agent, episode)
-            v = agent.v(start_state)
-            values.append(v)
+        value_snapshots = ValueSnapshots(start_state)
+        agent.train(n_episodes=n_episodes, progress_period=1000, callbacks=[value_snapshots])
 
-        axes.plot(x, values, label=label)
+        axes.plot(x, value_snapshots.values, label=label)
     axes.plot(x, values_baseline, label="VI")
     axes.set_xlabel("number of episodes")
     axes.set_ylabel(r"V($s_0$)")
@@ -215,7 +221,7 @@ def task_k(map_filepath, results_dir):
     for agent_name, agent in zip(agent_names, agents):
         # Train or solve
         if isinstance(agent, RLAgent):
-            agent.train(n_episodes)
+            agent.train(n_episodes, progress_period=100)
         elif isinstance(agent, MDPAgent):
             agent.solve()
         else:
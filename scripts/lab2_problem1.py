@@ -1,7 +1,11 @@
 import gym
+import io
+import numpy as np
+import time
 import torch
 from pathlib import Path
 from el2805.agents.rl import DQN
+from el2805.agents.rl.dqn import quantize_q_network
 from el2805.agents.rl.utils import get_device
 from utils import plot_training_stats, analyze_lunar_lander_agent, analyze_hyperparameter, compare_rl_agent_with_random
 
@@ -43,7 +47,7 @@ def task_c(results_dir, agent_path):
     )
 
     # Save results
-    agent.save(agent_path)
+    agent.save(agent_path, include_replay_buffer=False, include_optimizer=False)
     torch.save(agent.q_network, results_dir / "neural-network-1.pth")
     plot_training_stats(training_stats, results_dir)
 
@@ -128,9 +132,58 @@ def task_g(results_dir, agent_path):
     )
 
 
+def task_h(results_dir, agent_path):
+    results_dir.mkdir(parents=True, exist_ok=True)
+    agent = DQN.load(agent_path)
+    q_network = agent.q_network.cpu()
+    quantized_q_network = quantize_q_network(q_network)
+
+    # Sample states visited by the greedy policy
+    states = []
+    environment = agent.environment
+    environment.seed(SEED)
+    for _ in range(20):
+        done = False
+        state = environment.reset()
+        while not done:
+            states.append(state)
+            action = agent.compute_action(state, explore=False)
+            state, _, done, _ = environment.step(action)
+    states = torch.as_tensor(np.asarray(states), dtype=torch.float64)
+
+    # Greedy-action agreement
+    with torch.inference_mode():
+        actions = q_network(states).argmax(dim=1)
+        quantized_actions = quantized_q_network(states).argmax(dim=1)
+    agreement = (actions == quantized_actions).to(torch.float64).mean().item()
+
+    # Latency per action and size
+    def latency(q_network_):
+        with torch.inference_mode():
+            start = time.perf_counter_ns()
+            for state_ in states:
+                q_network_(state_.reshape(1, -1)).argmax()
+        return (time.perf_counter_ns() - start) / len(states) / 1e3
+
+    def size(q_network_):
+        buffer = io.BytesIO()
+        torch.save(q_network_.state_dict(), buffer)
+        return len(buffer.getvalue()) / 1e3
+
+    report = (
+        f"Greedy-action agreement: {agreement:.2%} over {len(states)} states\n"
+        f"Latency: {latency(q_network):.1f} us/action (float64), {latency(quantized_q_network):.1f} us/action (int8)\n"
+        f"Size: {size(q_network):.1f} kB (float64), {size(quantized_q_network):.1f} kB (int8)\n"
+    )
+    print(report)
+    with open(results_dir / "quantization.txt", mode="w") as file:
+        file.write(report)
+    torch.save(quantized_q_network, results_dir / "neural-network-1-int8.pth")
+
+
 def main():
     results_dir = Path(__file__).parent.parent / "results" / "lab2" / "problem1"
-    agent_path = results_dir / "task_c" / "dqn.pickle"
+    agent_path = results_dir / "task_c" / "dqn"
 
     print("Task (c)")
     task_c(results_dir / "task_c", agent_path)
@@ -152,6 +205,10 @@ def main():
     task_g(results_dir / "task_g", agent_path)
     print()
 
+    print("Task (h)")
+    task_h(results_dir / "task_h", agent_path)
+    print()
+
 
 if __name__ == "__main__":
     main()
@@ -8,6 +8,7 @@ from utils import plot_training_stats, analyze_lunar_lander_agent, analyze_hyper
 SEED = 1
 N_TRAIN_EPISODES = 1600
 EARLY_STOP_REWARD = 250
+N_WORKERS = 4
 AGENT_CONFIG = {
     "seed": SEED,
     "environment": gym.make("LunarLanderContinuous-v2"),
@@ -32,13 +33,14 @@ def task_c(results_dir, agent_path):
 
     # Train agent
     agent = PPO(**AGENT_CONFIG)
-    training_stats = agent.train(
+    training_stats = agent.train_parallel(
         n_episodes=N_TRAIN_EPISODES,
+        n_workers=N_WORKERS,
         early_stop_reward=EARLY_STOP_REWARD
     )
 
     # Save results
-    agent.save(agent_path)
+    agent.save(agent_path, include_replay_buffer=False, include_optimizer=False)
     torch.save(agent.actor, results_dir / "neural-network-3-actor.pth")
     torch.save(agent.critic, results_dir / "neural-network-3-critic.pth")
     plot_training_stats(training_stats, results_dir)
@@ -111,7 +113,7 @@ def task_g(results_dir, agent_path):
 
 def main():
     results_dir = Path(__file__).parent.parent / "results" / "lab2" / "problem3"
-    agent_path = results_dir / "task_c" / "ppo.pickle"
+    agent_path = results_dir / "task_c" / "ppo"
 
     print("Task (c)")
     task_c(results_dir / "task_c", agent_path)
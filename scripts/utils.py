@@ -1,12 +1,14 @@
 import numpy as np
+import os
 import torch
 import matplotlib.pyplot as plt
 from copy import deepcopy
+from pathlib import Path
 from el2805.envs import Maze, PluckingBerries, MinotaurMaze
 from el2805.envs.grid_world import Move
 from el2805.agents.rl import RLAgent, RandomAgent
-from el2805.agents.rl.utils import Experience
-from el2805.agents.utils import running_average
+from el2805.agents.rl.metric_recorder import load_metrics
+from el2805.agents.utils import running_average, sequential_estimate
 
 
 def best_maze_path(env, agent):
@@ -27,41 +29,31 @@ def best_maze_path(env, agent):
 
 def minotaur_maze_exit_probability(environment, agent):
     assert type(environment) == MinotaurMaze
-    n_episodes = 10000
-    n_wins = 0
-    for episode in range(1, n_episodes+1):
-        done = False
-        time_step = 0
-        environment.seed(episode)
-        state = environment.reset()
-        while not done:
-            action = agent.compute_action(state=state, time_step=time_step, explore=False)
-            state, _, done, info = environment.step(action)
-            time_step += 1
-            n_wins += info["won"]
-    exit_probability = n_wins / n_episodes
-    return exit_probability
-
 
-def train_rl_agent_one_episode(environment, agent, episode):
-    done = False
-    state = environment.reset()
-    while not done:
-        action = agent.compute_action(state=state, episode=episode)
-        next_state, reward, done, _ = environment.step(action)
-
-        experience = Experience(
-            episode=episode,
-            state=state,
-            action=action,
-            reward=reward,
-            next_state=next_state,
-            done=done
-        )
-        agent.record_experience(experience)
-        agent.update()
-
-        state = next_state
+    def run_episodes(episodes):
+        wins = []
+        for episode in episodes:
+            done = False
+            time_step = 0
+            environment.seed(episode)
+            state = environment.reset()
+            while not done:
+                action = agent.compute_action(state=state, time_step=time_step, explore=False)
+                state, _, done, info = environment.step(action)
+                time_step += 1
+            wins.append(info["won"])     # the episode is won at its last step
+        return wins
+
+    # Episodes in batches, until the exit probability is known within +-0.01 (with confidence level 0.95)
+    estimate = sequential_estimate(
+        run_episodes,
+        target_confidence=.01,
+        batch_size=1000,
+        min_episodes=1000,
+        max_episodes=10000
+    )
+    exit_probability = estimate.mean
+    return exit_probability
 
 
 def analyze_lunar_lander_agent(agent_function, environment, z_label, filepath):
@@ -120,15 +112,16 @@ def analyze_hyperparameter(
         )
 
 
-def compare_rl_agent_with_random(agent_path, agent_name, n_episodes, seed, results_dir):
-    # Test agents
+def compare_rl_agent_with_random(agent_path, agent_name, n_episodes, seed, results_dir, n_workers=None):
+    # Test agents (on the same episode seeds, in parallel)
+    n_workers = n_workers if n_workers is not None else min(os.cpu_count(), n_episodes)
     agent = RLAgent.load(agent_path)
     agent_random = RandomAgent(agent.environment, seed=seed)
     agents = [agent, agent_random]
     agent_names = [agent_name, "random"]
     avg_episode_rewards = []
     for agent_name, agent in zip(agent_names, agents):
-        test_stats = agent.test(n_episodes=n_episodes, render=False)
+        test_stats = agent.test(n_episodes=n_episodes, render=False, seed=seed, n_workers=n_workers)
         avg_episode_reward = np.mean(test_stats["episode_reward"])
         avg_episode_rewards.append(avg_episode_reward)
 
@@ -148,6 +141,10 @@ def print_and_write_line(filepath, output, mode):
 
 
 def plot_training_stats(stats, results_dir, label=None, figures=None):
+    # Stats written to disk by a MetricRecorder are read lazily
+    if isinstance(stats, (str, Path)):
+        stats = load_metrics(stats)
+
     if figures is None:
         figures = {metric_name: plt.subplots()[0] for metric_name in stats.keys()}
     else:
@@ -0,0 +1,26 @@
+import numpy as np
+import pickle
+import unittest
+from tests.utils import make_dqn
+
+
+class ActorLearnerTestCase(unittest.TestCase):
+    def test_train_async(self):
+        agent = make_dqn(replay_buffer_size=1000, cer=False, prefetch=2)
+        stats = agent.train_async(10, n_actors=2, seed=1)
+        self.assertEqual(len(stats["episode_reward"]), 10)
+        self.assertGreaterEqual(len(agent._replay_buffer), np.sum(stats["episode_length"]))
+
+        # The experiences collected by the actors are kept, and the agent can still be pickled
+        agent_loaded = pickle.loads(pickle.dumps(agent))
+        self.assertEqual(len(agent_loaded._replay_buffer), len(agent._replay_buffer))
+        stats = agent.test(n_episodes=4, render=False, seed=1)
+        stats_parallel = agent.test(n_episodes=4, render=False, seed=1, n_workers=2)
+        np.testing.assert_array_equal(stats["episode_reward"], stats_parallel["episode_reward"])
+
+        # Training goes on in the usual mode
+        agent.train(n_episodes=2)
+
+
+if __name__ == "__main__":
+    unittest.main()
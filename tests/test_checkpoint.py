@@ -0,0 +1,78 @@
+import numpy as np
+import tempfile
+import unittest
+from pathlib import Path
+from el2805.agents.rl import QLearning
+from el2805.agents.rl.checkpoint import Checkpointer, load_checkpoint
+from el2805.agents.rl.metric_recorder import MetricRecorder, load_metrics
+from el2805.envs import MinotaurMaze
+from tests.utils import make_dqn, make_ppo
+
+
+def make_q_learning():
+    environment = MinotaurMaze(
+        map_filepath=Path(__file__).parent.parent / "data" / "maze_minotaur.txt",
+        minotaur_chase=True,
+        keys=False,
+        probability_poison_death=1/50
+    )
+    return QLearning(
+        environment=environment,
+        learning_rate="decay",
+        discount=.98,
+        alpha=.55,
+        epsilon=.2,
+        q_init=.01,
+        seed=1
+    )
+
+
+class CheckpointTestCase(unittest.TestCase):
+    def _test_resume(self, make_agent, n_episodes):
+        stats = make_agent().train(n_episodes)
+
+        with tempfile.TemporaryDirectory() as directory:
+            filepath = Path(directory) / "checkpoint.pkl"
+            make_agent().train(n_episodes // 2, callbacks=[Checkpointer(filepath, period=n_episodes // 2)])
+            stats_resumed = make_agent().train(n_episodes, resume_from=filepath)
+
+        self.assertEqual(set(stats), set(stats_resumed))
+        for metric_name in stats:
+            np.testing.assert_array_equal(stats[metric_name], stats_resumed[metric_name])
+
+    def test_resume_dqn(self):
+        self._test_resume(lambda: make_dqn(n_step=3, prefetch=2), n_episodes=20)
+
+    def test_resume_ppo(self):
+        self._test_resume(lambda: make_ppo(rollout_length=300), n_episodes=4)
+
+    def test_resume_q_learning(self):
+        self._test_resume(make_q_learning, n_episodes=30)
+
+    def test_resume_disk(self):
+        n_episodes = 20
+        stats = make_dqn().train(n_episodes)
+
+        with tempfile.TemporaryDirectory() as directory:
+            # The run goes on after the checkpoint, so the files contain values to discard when resuming
+            filepath = Path(directory) / "checkpoint.pkl"
+            metrics = MetricRecorder(directory, chunk_size=4)
+            make_dqn().train(15, metrics=metrics, callbacks=[Checkpointer(filepath, period=10)])
+
+            # Only the values of the current chunks are in the checkpoint
+            for column_state in load_checkpoint(filepath)["stats"].values():
+                self.assertEqual(column_state["n_written"], 8)
+                self.assertEqual(len(column_state["values"]), 2)
+
+            metrics = MetricRecorder(directory, chunk_size=4)
+            make_dqn().train(n_episodes, metrics=metrics, resume_from=filepath)
+            stats_resumed = load_metrics(directory)
+
+            self.assertEqual(set(stats), set(stats_resumed))
+            for metric_name in stats:
+                np.testing.assert_array_equal(stats[metric_name], stats_resumed[metric_name])
+            del metrics, stats_resumed  # release memory maps before cleanup
+
+
+if __name__ == "__main__":
+    unittest.main()
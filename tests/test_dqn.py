@@ -0,0 +1,41 @@
+import numpy as np
+import unittest
+from unittest import mock
+from el2805.agents.rl.utils import Experience
+from tests.utils import make_dqn
+
+
+class DQNTestCase(unittest.TestCase):
+    def test_replay_ratio(self):
+        n_steps = 200
+        replay_buffer_min = 100
+        rng = np.random.RandomState(1)
+
+        for update_every, gradient_steps in [(1, 1), (4, 1), (4, 2), (3, 5)]:
+            with self.subTest(update_every=update_every, gradient_steps=gradient_steps):
+                agent = make_dqn(
+                    replay_buffer_min=replay_buffer_min,
+                    update_every=update_every,
+                    gradient_steps=gradient_steps
+                )
+                with mock.patch.object(agent, "_gradient_step", wraps=agent._gradient_step) as gradient_step:
+                    n_losses = 0
+                    for _ in range(n_steps):
+                        agent.record_experience(Experience(
+                            episode=1,
+                            state=rng.normal(size=4),
+                            action=rng.randint(2),
+                            reward=1,
+                            next_state=rng.normal(size=4),
+                            done=False
+                        ))
+                        n_losses += len(agent.update().get("loss", []))
+
+                # One update every update_every steps once the buffer is filled, each with gradient_steps mini-batches
+                n_updates = len([t for t in range(1, n_steps + 1) if t >= replay_buffer_min and t % update_every == 0])
+                self.assertEqual(gradient_step.call_count, n_updates * gradient_steps)
+                self.assertEqual(n_losses, n_updates * gradient_steps)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,68 @@
+import gym
+import numpy as np
+import unittest
+from el2805.agents.rl import RandomAgent
+from el2805.agents.utils import RunningAverage, RunningStatistics, sequential_estimate
+from tests.utils import make_ppo
+
+
+class EvaluationTestCase(unittest.TestCase):
+    def test_parallel_test(self):
+        agent = RandomAgent(gym.make("CartPole-v1"), seed=1)
+        stats = agent.test(n_episodes=10, render=False, seed=1)
+        stats_parallel = agent.test(n_episodes=10, render=False, seed=1, n_workers=3)
+
+        self.assertEqual(set(stats), set(stats_parallel))
+        for metric_name in stats:
+            np.testing.assert_array_equal(stats[metric_name], stats_parallel[metric_name])
+
+    def test_seeded_test_during_training(self):
+        # The seeds of the test episodes do not affect the rest of the training
+        agent = make_ppo()
+        agent.train(n_episodes=1)
+        stats = agent.train(n_episodes=1)
+        agent_tested = make_ppo()
+        agent_tested.train(n_episodes=1)
+        agent_tested.test(n_episodes=2, render=False, seed=2)
+        stats_tested = agent_tested.train(n_episodes=1)
+        for metric_name in stats:
+            np.testing.assert_array_equal(stats[metric_name], stats_tested[metric_name])
+
+    def test_running_statistics(self):
+        values = np.random.RandomState(1).normal(loc=100, scale=3, size=1000)
+        statistics = RunningStatistics()
+        statistics.extend(values)
+        self.assertEqual(statistics.n_values, len(values))
+        self.assertAlmostEqual(statistics.mean, np.mean(values))
+        self.assertAlmostEqual(statistics.variance, np.var(values, ddof=1))
+
+    def test_running_average(self):
+        values = np.random.RandomState(1).normal(loc=100, scale=3, size=10000)
+        window_length = 50
+        running_average = RunningAverage(window_length)
+        averages = [running_average.append(value) for value in values]
+        expected_averages = [np.mean(values[max(0, i-window_length+1):i+1]) for i in range(len(values))]
+        np.testing.assert_allclose(averages, expected_averages, rtol=1e-13, atol=0)
+
+    def test_sequential_estimate(self):
+        def make_run_episodes(mean):
+            rng = np.random.RandomState(1)
+            return lambda episodes: rng.normal(loc=mean, scale=10, size=len(episodes))
+
+        kwargs = {"threshold": 50, "batch_size": 10, "min_episodes": 20, "max_episodes": 1000}
+
+        # Clearly good or clearly bad: decided after the minimum number of episodes
+        for mean in (100, 0):
+            estimate = sequential_estimate(make_run_episodes(mean), **kwargs)
+            self.assertEqual(estimate.n_episodes, 20)
+            self.assertEqual(estimate.mean - estimate.confidence >= 50, mean > 50)
+
+        # Borderline: all the episodes are needed
+        estimate = sequential_estimate(make_run_episodes(50), **kwargs)
+        self.assertEqual(estimate.n_episodes, 1000)
+        low, high = estimate.interval
+        self.assertTrue(low < 50 <= high)
+
+
+if __name__ == "__main__":
+    unittest.main()
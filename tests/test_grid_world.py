@@ -0,0 +1,26 @@
+import unittest
+from copy import deepcopy
+from pathlib import Path
+from el2805.envs import MinotaurMaze
+
+
+class GridWorldTestCase(unittest.TestCase):
+    def test_deepcopy(self):
+        environment = MinotaurMaze(map_filepath=Path(__file__).parent.parent / "data" / "maze_minotaur.txt")
+        environment.reset()
+        environment_copy = deepcopy(environment)
+
+        # The model is shared, and it cannot be modified through any copy
+        for name in environment._model_attributes:
+            self.assertIs(getattr(environment_copy, name), getattr(environment, name))
+        with self.assertRaises(ValueError):
+            environment_copy.map[0, 0] = environment.map[0, 1]
+
+        # The simulator state is copied
+        self.assertIsNot(environment_copy.np_random, environment.np_random)
+        environment_copy.step(environment_copy.valid_actions(environment_copy._current_state)[0])
+        self.assertEqual(environment._n_steps, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
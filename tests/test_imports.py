@@ -0,0 +1,39 @@
+import subprocess
+import sys
+import unittest
+
+# Imports needed by tabular workers (MDP solvers and tabular RL agents)
+_TABULAR_IMPORTS = """
+import sys
+import time
+start = time.perf_counter()
+from el2805.envs import MinotaurMaze
+from el2805.agents.mdp import DynamicProgramming, ValueIteration
+from el2805.agents.rl import RLAgent, QLearning, Sarsa
+print(time.perf_counter() - start, "torch" in sys.modules)
+"""
+
+_TORCH_IMPORT = """
+import time
+start = time.perf_counter()
+import torch
+print(time.perf_counter() - start)
+"""
+
+
+def _run(code):
+    # Fresh interpreter, so that nothing is imported yet
+    output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout
+    return output.split()
+
+
+class ImportsTestCase(unittest.TestCase):
+    def test_tabular_imports(self):
+        import_time, torch_imported = _run(_TABULAR_IMPORTS)
+        torch_import_time, = _run(_TORCH_IMPORT)
+        self.assertEqual(torch_imported, "False")
+        self.assertLess(float(import_time), float(torch_import_time))
+
+
+if __name__ == "__main__":
+    unittest.main()
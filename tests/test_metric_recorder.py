@@ -0,0 +1,54 @@
+import numpy as np
+import tempfile
+import unittest
+from el2805.agents.rl.metric_recorder import MetricRecorder, load_metrics
+
+
+class MetricRecorderTestCase(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.RandomState(1)
+        self.episode_rewards = rng.normal(size=1000)
+        self.losses = rng.normal(size=5003)
+
+    def record(self, metrics):
+        for i, episode_reward in enumerate(self.episode_rewards):
+            metrics.append("episode_reward", episode_reward)
+            metrics.record({"loss": list(self.losses[5*i:5*(i+1)])})
+        metrics.record({"loss": list(self.losses[5000:])})
+        metrics.close()
+
+    def test_memory(self):
+        metrics = MetricRecorder(chunk_size=64)
+        self.record(metrics)
+        self.assertEqual(list(metrics), ["episode_reward", "loss"])
+        np.testing.assert_array_equal(metrics["episode_reward"], self.episode_rewards)
+        np.testing.assert_array_equal(metrics["loss"], self.losses)
+
+    def test_disk(self):
+        with tempfile.TemporaryDirectory() as directory:
+            metrics = MetricRecorder(directory, chunk_size=64)
+            self.record(metrics)
+            np.testing.assert_array_equal(metrics["loss"], self.losses)
+
+            loaded = load_metrics(directory)
+            np.testing.assert_array_equal(loaded["episode_reward"], self.episode_rewards)
+            np.testing.assert_array_equal(loaded["loss"], self.losses)
+            del metrics, loaded     # release memory maps before cleanup
+
+    def test_aggregation(self):
+        metrics = MetricRecorder(chunk_size=64, aggregation_period=10, aggregated_metrics=["loss"])
+        self.record(metrics)
+        expected_losses = [self.losses[i:i+10].mean() for i in range(0, len(self.losses), 10)]
+        np.testing.assert_array_equal(metrics["episode_reward"], self.episode_rewards)   # per-episode, not aggregated
+        np.testing.assert_allclose(metrics["loss"], expected_losses)
+
+    def test_missing_metric(self):
+        metrics = MetricRecorder()
+        metrics.append("episode_reward", 1)
+        self.assertNotIn("loss", metrics)
+        self.assertEqual(len(metrics["loss"]), 0)
+        self.assertEqual(list(metrics), ["episode_reward"])
+
+
+if __name__ == '__main__':
+    unittest.main()
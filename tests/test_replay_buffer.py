@@ -0,0 +1,94 @@
+import gc
+import numpy as np
+import torch
+import unittest
+import weakref
+from el2805.agents.rl.replay_buffer import ReplayBuffer, NStepAccumulator, MinibatchPrefetcher
+from el2805.agents.rl.utils import Experience
+
+
+class NStepAccumulatorTestCase(unittest.TestCase):
+    @staticmethod
+    def make_episode(n_steps):
+        # state i, reward i+1, the last experience is terminal
+        return [
+            Experience(
+                episode=1,
+                state=np.array([i]),
+                action=0,
+                reward=i + 1,
+                next_state=np.array([i + 1]),
+                done=i == n_steps - 1
+            )
+            for i in range(n_steps)
+        ]
+
+    def check_episode(self, n_steps, episode_length):
+        discount = .9
+        accumulator = NStepAccumulator(n_steps=n_steps, discount=discount)
+        completed = []
+        for t, experience in enumerate(self.make_episode(episode_length)):
+            completed_now = accumulator.append(experience)
+            # Before the end of the episode, an experience is completed only once n_steps rewards are known
+            if not experience.done:
+                self.assertEqual(len(completed_now), int(t + 1 >= n_steps))
+            completed.extend(completed_now)
+
+        self.assertEqual(len(completed), episode_length)
+        for i, experience in enumerate(completed):
+            last = min(i + n_steps, episode_length)    # the returns are cut off at the end of the episode
+            expected_reward = sum(discount ** (t - i) * (t + 1) for t in range(i, last))
+            self.assertEqual(experience.state, i)
+            self.assertAlmostEqual(experience.reward, expected_reward)
+            self.assertEqual(experience.next_state, last)
+            self.assertEqual(experience.done, last == episode_length)
+
+    def test_episode_longer_than_n(self):
+        self.check_episode(n_steps=3, episode_length=7)
+
+    def test_episode_shorter_than_n(self):
+        self.check_episode(n_steps=5, episode_length=3)
+
+    def test_one_step(self):
+        self.check_episode(n_steps=1, episode_length=4)
+
+
+class ReplayBufferTestCase(unittest.TestCase):
+    def test_state_dict(self):
+        replay_buffer = ReplayBuffer(capacity=1000, state_dim=2)
+        for i in range(10):
+            replay_buffer.append(Experience(
+                episode=1, state=np.full(2, i), action=0, reward=i, next_state=np.full(2, i + 1), done=False
+            ))
+
+        # Only the stored experiences are saved, not the whole preallocated storage
+        state = replay_buffer.state_dict()
+        self.assertEqual(state["states"].untyped_storage().nbytes(), state["states"].nbytes)
+        replay_buffer_loaded = ReplayBuffer(capacity=1000, state_dim=2)
+        replay_buffer_loaded.load_state_dict(state)
+        self.assertEqual(len(replay_buffer_loaded), 10)
+
+
+class MinibatchPrefetcherTestCase(unittest.TestCase):
+    def test_garbage_collection(self):
+        replay_buffer = ReplayBuffer(capacity=10, state_dim=2)
+        for i in range(10):
+            replay_buffer.append(Experience(
+                episode=1, state=np.full(2, i), action=0, reward=i, next_state=np.full(2, i + 1), done=False
+            ))
+        prefetcher = MinibatchPrefetcher(replay_buffer=replay_buffer, device="cpu", n_prefetch=1)
+        prefetcher.put(torch.arange(3))
+        torch.testing.assert_close(prefetcher.get()[2], torch.arange(3, dtype=torch.float64))
+
+        # Without calling close(), the thread stops and does not keep the replay buffer alive
+        thread = prefetcher._thread
+        replay_buffer_ref = weakref.ref(replay_buffer)
+        del prefetcher, replay_buffer
+        gc.collect()
+        thread.join(timeout=10)
+        self.assertFalse(thread.is_alive())
+        self.assertIsNone(replay_buffer_ref())
+
+
+if __name__ == "__main__":
+    unittest.main()
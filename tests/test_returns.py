@@ -0,0 +1,57 @@
+import unittest
+import torch
+from el2805.agents.rl.returns import discounted_returns, generalized_advantage_estimation
+
+
+def reference_discounted_cumsum(x, discount, dones, bootstrap):
+    y = torch.empty_like(x)
+    y_next = bootstrap
+    for t in reversed(range(len(x))):
+        y_next = x[t] + discount * (1 - float(dones[t])) * y_next
+        y[t] = y_next
+    return y
+
+
+class ReturnsTestCase(unittest.TestCase):
+    seed = 1
+
+    def setUp(self):
+        self.generator = torch.Generator().manual_seed(self.seed)
+
+    def _random_episodes(self, n):
+        rewards = torch.randn(n, dtype=torch.float64, generator=self.generator)
+        values = torch.randn(n, dtype=torch.float64, generator=self.generator)
+        dones = torch.rand(n, generator=self.generator) < 0.01
+        return rewards, values, dones
+
+    def test_discounted_returns(self):
+        for n in [1, 255, 256, 257, 2000]:
+            for discount in [0, 0.5, 0.99, 1]:
+                rewards, _, dones = self._random_episodes(n)
+                returns = discounted_returns(rewards, discount, dones, last_value=3)
+                expected = reference_discounted_cumsum(rewards, discount, dones, 3)
+                self.assertTrue(torch.allclose(returns, expected, rtol=1e-10, atol=1e-10), msg=f"n={n}, d={discount}")
+
+    def test_generalized_advantage_estimation(self):
+        discount, gae_lambda = 0.99, 0.95
+        rewards, values, dones = self._random_episodes(1000)
+        advantages, returns = generalized_advantage_estimation(
+            rewards, values, discount, gae_lambda, dones, last_value=3
+        )
+        next_values = torch.cat((values[1:], torch.tensor([3.], dtype=torch.float64)))
+        deltas = rewards + discount * next_values * dones.logical_not() - values
+        expected = reference_discounted_cumsum(deltas, discount * gae_lambda, dones, 0)
+        self.assertTrue(torch.allclose(advantages, expected, rtol=1e-10, atol=1e-10))
+        self.assertTrue(torch.allclose(returns, advantages + values))
+
+    def test_generalized_advantage_estimation_monte_carlo(self):
+        discount = 0.9
+        rewards, values, dones = self._random_episodes(500)
+        dones[-1] = True
+        _, returns = generalized_advantage_estimation(rewards, values, discount, 1, dones)
+        expected = discounted_returns(rewards, discount, dones)
+        self.assertTrue(torch.allclose(returns, expected, rtol=1e-10, atol=1e-10))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,53 @@
+import gym
+import numpy as np
+import unittest
+from el2805.agents.rl import RandomAgent
+from el2805.agents.rl.utils import Experience
+
+
+class CountingEnvironment(gym.Env):
+    """Environment whose reward is the number of the step, ending after episode_length steps."""
+
+    def __init__(self, episode_length: int):
+        self.episode_length = episode_length
+        self.observation_space = gym.spaces.Box(low=0, high=episode_length, shape=(1,))
+        self.action_space = gym.spaces.Discrete(2)
+        self._n_steps = 0
+
+    def reset(self):
+        self._n_steps = 0
+        return np.zeros(1)
+
+    def step(self, action):
+        self._n_steps += 1
+        return np.array([self._n_steps]), self._n_steps, self._n_steps == self.episode_length, {}
+
+
+class RecordingAgent(RandomAgent):
+    def __init__(self, environment: gym.Env):
+        super().__init__(environment=environment, seed=1)
+        self.experiences = []
+
+    def update(self) -> dict:
+        return {}
+
+    def record_experience(self, experience: Experience) -> None:
+        self.experiences.append(experience)
+
+
+class RLAgentTestCase(unittest.TestCase):
+    def test_action_repeat(self):
+        # The episode ends in the middle of the third repetition
+        agent = RecordingAgent(CountingEnvironment(episode_length=7))
+        stats = agent.train(n_episodes=1, action_repeat=3)
+
+        # One experience per action, with the reward summed over the repeated steps
+        self.assertEqual([experience.reward for experience in agent.experiences], [1+2+3, 4+5+6, 7])
+        self.assertEqual([experience.done for experience in agent.experiences], [False, False, True])
+        np.testing.assert_array_equal(agent.experiences[-1].next_state, [7])
+        np.testing.assert_array_equal(stats["episode_reward"], [28])
+        np.testing.assert_array_equal(stats["episode_length"], [7])
+
+
+if __name__ == "__main__":
+    unittest.main()
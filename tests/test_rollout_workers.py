@@ -0,0 +1,28 @@
+import numpy as np
+import torch
+import unittest
+from tests.utils import make_ppo
+
+
+class RolloutWorkersTestCase(unittest.TestCase):
+    def test_train_parallel(self):
+        stats = make_ppo(rollout_length=200).train_parallel(4, n_workers=2, seed=1)
+        self.assertEqual(len(stats["episode_reward"]), 4)
+
+        # Same seed, same training
+        stats_repeated = make_ppo(rollout_length=200).train_parallel(4, n_workers=2, seed=1)
+        self.assertEqual(set(stats), set(stats_repeated))
+        for metric_name in stats:
+            np.testing.assert_array_equal(stats[metric_name], stats_repeated[metric_name])
+
+    def test_worker_failure(self):
+        agent = make_ppo(rollout_length=200)
+        with torch.no_grad():
+            for parameter in agent.actor.parameters():
+                parameter.fill_(float("nan"))   # the workers fail to sample the actions
+        with self.assertRaisesRegex(RuntimeError, "exit code 1"):
+            agent.train_parallel(4, n_workers=2, seed=1)
+
+
+if __name__ == "__main__":
+    unittest.main()
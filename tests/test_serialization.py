@@ -0,0 +1,51 @@
+import gym
+import numpy as np
+import tempfile
+import unittest
+from pathlib import Path
+from el2805.agents.rl import RLAgent, PPO
+from tests.utils import make_ppo
+
+
+class SerializationTestCase(unittest.TestCase):
+    def test_save_load(self):
+        agent = make_ppo(rollout_length=150)
+        agent.train(n_episodes=1)
+        states = np.random.RandomState(1).normal(size=(10, 3))
+
+        with tempfile.TemporaryDirectory() as directory:
+            # Full state: training continues exactly
+            agent.save(Path(directory) / "full")
+            agent_loaded = RLAgent.load(Path(directory) / "full")
+            self.assertIsInstance(agent_loaded, PPO)
+            stats = agent.train(n_episodes=1)
+            stats_loaded = agent_loaded.train(n_episodes=1)
+            for metric_name in stats:
+                np.testing.assert_array_equal(stats[metric_name], stats_loaded[metric_name])
+
+            # Policy only
+            agent.save(Path(directory) / "policy", include_replay_buffer=False, include_optimizer=False)
+            agent_loaded = RLAgent.load(Path(directory) / "policy")
+            np.testing.assert_array_equal(
+                agent.compute_actions(states, deterministic=True),
+                agent_loaded.compute_actions(states, deterministic=True)
+            )
+
+    def test_environment_kwargs(self):
+        agent = make_ppo(environment=gym.make("Pendulum-v1", g=5.0))
+        with tempfile.TemporaryDirectory() as directory:
+            agent.save(directory, include_replay_buffer=False, include_optimizer=False)
+            agent_loaded = RLAgent.load(directory)
+        self.assertEqual(agent_loaded.environment.unwrapped.g, 5.0)
+
+    def test_unserializable_config(self):
+        agent = make_ppo(actor_learning_rate=np.float32(1e-4))
+        with tempfile.TemporaryDirectory() as directory:
+            filepath = Path(directory) / "agent"
+            with self.assertRaisesRegex(TypeError, "actor_learning_rate"):
+                agent.save(filepath)
+            self.assertFalse(filepath.exists())
+
+
+if __name__ == "__main__":
+    unittest.main()
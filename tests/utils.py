@@ -1,26 +1,74 @@
-import numpy as np
-from tqdm import trange
+import gym
+from tqdm import tqdm
+from el2805.agents.rl import DQN, PPO
+from el2805.agents.utils import sequential_estimate
+
+
+def make_dqn(**kwargs):
+    # Small DQN on CartPole, the arguments override the default configuration
+    config = dict(
+        environment=gym.make("CartPole-v1"),
+        discount=.99,
+        epsilon=.1,
+        learning_rate=5e-4,
+        batch_size=32,
+        replay_buffer_size=500,
+        replay_buffer_min=100,
+        target_update_period=50,
+        gradient_max_norm=1,
+        hidden_layer_sizes=[32],
+        hidden_layer_activation="relu",
+        cer=True,
+        dueling=False,
+        device="cpu",
+        seed=1
+    )
+    config.update(kwargs)
+    return DQN(**config)
+
+
+def make_ppo(**kwargs):
+    # Small PPO on Pendulum, the arguments override the default configuration
+    config = dict(
+        environment=gym.make("Pendulum-v1"),
+        discount=.99,
+        n_epochs_per_step=2,
+        epsilon=.2,
+        critic_learning_rate=1e-3,
+        critic_hidden_layer_sizes=[16],
+        critic_hidden_layer_activation="relu",
+        actor_learning_rate=1e-4,
+        actor_shared_hidden_layer_sizes=[16],
+        actor_mean_hidden_layer_sizes=[8],
+        actor_var_hidden_layer_sizes=[8],
+        actor_hidden_layer_activation="relu",
+        gradient_max_norm=1,
+        device="cpu",
+        seed=1
+    )
+    config.update(kwargs)
+    return PPO(**config)
 
 
 def test(test_case, environment, compute_action):
-    n_episodes = 50
+    max_episodes = 50
     confidence_pass = 50
 
-    episode_rewards = []
-    episodes = trange(n_episodes, desc='Episode: ', leave=True)
-    for episode in episodes:
-        episodes.set_description(f"Episode {episode}")
-        done = False
-        state = environment.reset()
-        episode_reward = 0.
-        while not done:
-            action = compute_action(state)
-            next_state, reward, done, _ = environment.step(action)
-            episode_reward += reward
-            state = next_state
-
-        episode_rewards.append(episode_reward)
-        environment.close()
+    def run_episodes(episodes):
+        episode_rewards = []
+        episodes = tqdm(episodes, desc='Episode: ', leave=True)
+        for episode in episodes:
+            episodes.set_description(f"Episode {episode}")
+            done = False
+            state = environment.reset()
+            episode_reward = 0.
+            while not done:
+                action = compute_action(state)
+                next_state, reward, done, _ = environment.step(action)
+                episode_reward += reward
+                state = next_state
+            episode_rewards.append(episode_reward)
+        return episode_rewards
 
     # Assumption: episode reward has Gaussian distribution
     # Goal: estimate the mean value by taking the sample mean
@@ -31,9 +79,21 @@ def test(test_case, environment, compute_action):
     # Confidence: confidence = q_0.975 * std_reward / sqrt(n)
     #
     # See "Philosophy of Science and Research Methodology" course
-    avg_reward = np.mean(episode_rewards)
-    confidence = np.std(episode_rewards) * 1.96 / np.sqrt(n_episodes)
+    #
+    # The episodes are run in batches, until the confidence interval is entirely above or below the confidence pass
+    # (clearly good or clearly bad agent), or until max_episodes episodes. The interval is checked up to 4 times, so
+    # each check uses confidence level 1 - 0.05/4 (q_0.99375 instead of q_0.975), keeping the overall false-pass rate
+    # at 0.05.
+    estimate = sequential_estimate(
+        run_episodes,
+        threshold=confidence_pass,
+        batch_size=10,
+        min_episodes=20,
+        max_episodes=max_episodes
+    )
+    environment.close()
     test_case.assertTrue(
-        expr=avg_reward - confidence >= confidence_pass,
-        msg=f"Avg reward ({avg_reward}) - Confidence ({confidence}) < Confidence pass ({confidence_pass})"
+        expr=estimate.mean - estimate.confidence >= confidence_pass,
+        msg=f"Avg reward ({estimate.mean}) - Confidence ({estimate.confidence}) < Confidence pass ({confidence_pass}) "
+            f"after {estimate.n_episodes} episodes"
     )